@@ -31,8 +31,9 @@ from .nodes.DN_TextDropDownNode import DN_TextDropDownNode
 from .nodes.DN_CSVMultiDropDownNode import DN_CSVMultiDropDownNode
 from .nodes.DN_WildcardPromptEditorNode import DN_WildcardPromptEditorNode
 from .nodes.DN_WildcardSelectorComposerV2 import DN_WildcardSelectorComposerV2
-from .nodes.DN_PromptSectionsExtractor import DN_PromptSectionsExtractor
+from .nodes.DN_PromptSectionsExtractor import DN_PromptSectionsExtractor, DN_PromptMarksExtractor
 from .nodes.DN_WildcardsProcessor import DN_WildcardsProcessor
+from .nodes.DN_WildcardsBatchProcessor import DN_WildcardsBatchProcessor
 from .nodes.DN_SmolVLMNode import DN_SmolVLMNode
 # from .nodes.pinterest_fetch import PinterestFetch
 from .nodes.DN_JoyTaggerNode import DN_JoyTaggerNode
@@ -56,7 +57,7 @@ from .nodes.DN_ChutesImageToVideoNode import DN_ChutesImageToVideoNode
 from .nodes.DN_PreviewImage import DN_PreviewImage
 from .nodes.DN_ChutesParallelImageNode import DN_ChutesParallelImageNode
 from .nodes.DN_ImageBatcher import DN_ImageBatcher
-from .nodes.DN_MemoryStorage import DN_MemoryStorage
+from .nodes.DN_MemoryStorage import DN_MemoryStorage, DN_TypedMemoryStorage
 
 from .nodes.utils.api_routes import register_routes
 
@@ -69,7 +70,9 @@ NODE_CLASS_MAPPINGS = {
     "DN_WildcardPromptEditorNode": DN_WildcardPromptEditorNode,
     "DN_WildcardSelectorComposerV2": DN_WildcardSelectorComposerV2,
     "DN_PromptSectionsExtractor": DN_PromptSectionsExtractor,
+    "DN_PromptMarksExtractor": DN_PromptMarksExtractor,
     "DN_WildcardsProcessor": DN_WildcardsProcessor,
+    "DN_WildcardsBatchProcessor": DN_WildcardsBatchProcessor,
     "DN_SmolVLMNode": DN_SmolVLMNode,
     # "PinterestFetch": PinterestFetch,
     "DN_JoyTaggerNode": DN_JoyTaggerNode,
@@ -94,6 +97,7 @@ NODE_CLASS_MAPPINGS = {
     "DN_ChutesParallelImageNode": DN_ChutesParallelImageNode,
     "DN_ImageBatcher": DN_ImageBatcher,
     "DN_MemoryStorage": DN_MemoryStorage,
+    "DN_TypedMemoryStorage": DN_TypedMemoryStorage,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
@@ -105,7 +109,9 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "DN_WildcardPromptEditorNode": "Wildcard Prompt Editor (deprecation pending)",
     "DN_WildcardSelectorComposerV2": "Wildcard Selector/Composer",
     "DN_PromptSectionsExtractor": "Prompt Sections Extractor",
+    "DN_PromptMarksExtractor": "Prompt Marks Extractor",
     "DN_WildcardsProcessor": "Wildcards Processor",
+    "DN_WildcardsBatchProcessor": "Wildcards Batch Processor",
     "DN_SmolVLMNode": "SmolVLM Image Describer",
     # "PinterestNode": "Pinterest Node",
     "DN_JoyTaggerNode": "JoyTagger",
@@ -130,6 +136,7 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "DN_ChutesParallelImageNode": "Chutes Parallel Image Generator",
     "DN_ImageBatcher": "Image Batcher",
     "DN_MemoryStorage": "Memory Storage",
+    "DN_TypedMemoryStorage": "Memory Storage (Typed)",
 }
 
 register_routes()
@@ -79,15 +79,11 @@ class DN_CSVMultiDropDownNode:
         timestamp = time.time()
         return f"{node_id}:{json.dumps(selections_for_node)}:{timestamp}"
 
-@register_operation_handler
-async def handle_csv_dropdown_operations(request):
+@register_operation_handler('update_selections', 'remove_csv_selection')
+async def handle_csv_dropdown_operations(data):
     """Handle multi-dropdown operations via message route"""
     try:
-        data = await request.json()
         operation = data.get('operation')
-        if operation not in ['update_selections', 'remove_selection']:
-            return None
-
         node_id = str(data.get('id', ''))
         payload = data.get('payload', {})
 
@@ -109,7 +105,7 @@ async def handle_csv_dropdown_operations(request):
 
             return web.json_response({"status": "success"})
 
-        elif operation == 'remove_selection':
+        elif operation == 'remove_csv_selection':
             DN_CSVMultiDropDownNode.selections.pop(node_id, None)
             DN_CSVMultiDropDownNode.entries_map.pop(node_id, None)
             return web.json_response({"status": "success"})
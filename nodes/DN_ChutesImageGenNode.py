@@ -136,14 +136,9 @@ def prepare_ordered_widgets_from_schema(schema_data):
         
     return {"widgets": ordered_widgets}
 
-@register_operation_handler
-async def handle_chutes_image_gen_request(request):
-    data = await request.json()
+@register_operation_handler('get_models', 'chutes_img_model')
+async def handle_chutes_image_gen_request(data):
     operation = data.get('operation')
-    
-    valid_operations = ['get_models', 'chutes_img_model']
-    if operation not in valid_operations:
-        return None
         
     if operation == 'get_models':
         models_data = load_model_config()
@@ -209,12 +209,9 @@ class DN_ChutesLLMNode:
 
         return (thinking, response, json.dumps(complete_response, indent=2))
 
-@register_operation_handler
-async def handle_llm_operations(request):
-    data = await request.json()
+@register_operation_handler('get_all_llm_prompts', 'get_llm_prompt', 'store_llm_prompt', 'delete_llm_prompt')
+async def handle_llm_operations(data):
     operation = data.get('operation')
-    if operation not in ['get_all_llm_prompts', 'get_llm_prompt', 'store_llm_prompt', 'delete_llm_prompt']:
-        return None
 
     if operation == 'get_all_llm_prompts':
         prompts = get_llm_prompts()
@@ -154,13 +154,10 @@ def save_qwen_edit_prompts(data):
         json.dump(data, f)
 
 
-@register_operation_handler
-async def handle_qwen_edit_operations(request):
+@register_operation_handler('get_qwen_edit_prompt', 'store_qwen_edit_prompt', 'get_all_qwen_edit_prompts', 'delete_qwen_edit_prompt')
+async def handle_qwen_edit_operations(data):
     try:
-        data = await request.json()
         operation = data.get('operation')
-        if operation not in ['get_qwen_edit_prompt', 'store_qwen_edit_prompt', 'get_all_qwen_edit_prompts', 'delete_qwen_edit_prompt']:
-            return None
 
         if operation == 'get_all_qwen_edit_prompts':
             prompts = get_qwen_edit_prompts()
@@ -1,3 +1,4 @@
+import json
 import torch
 from PIL import Image
 from pathlib import Path
@@ -5,6 +6,7 @@ from huggingface_hub import snapshot_download
 import torchvision.transforms.functional as TVF
 from torchvision import transforms
 from .joytagger import Models
+from .utils.tagger_utils import accuracy_fixture_images, load_quantized_model, score_cache
 from .. import constants
 
 BASE_DIR = constants.BASE_DIR
@@ -49,11 +51,24 @@ def process_tag(tag):
     tag = tag.strip()
     return tag
 
+def joytag_weights_file(model_path):
+    safetensors_file = Path(model_path) / 'model.safetensors'
+    return safetensors_file if safetensors_file.exists() else Path(model_path) / 'model.pt'
+
+def build_joytag_skeleton(model_path):
+    with open(Path(model_path) / 'config.json', 'r') as f:
+        config = json.load(f)
+    return Models.VisionModel.from_config(config)
+
+def joytag_scores(model, image_tensor):
+    return model({'image': image_tensor})['tags'].sigmoid()
+
 class DN_JoyTaggerNode:
     def __init__(self):
         self.model = None
         self.top_tags = None
         self.current_device = None  # Track the currently loaded device
+        self.quantized = False
 
     def _parse_exclude_tags(self, exclude_tags):
         exclude_list = set()
@@ -98,6 +113,8 @@ class DN_JoyTaggerNode:
                     "tooltip": "Use underscores instead of spaces between words in tags."
                 }),
                 "use_cpu": ("BOOLEAN", {"default": False, "tooltip": "If true, unload the model from GPU and use CPU instead."}),
+                "quantize_cpu": ("BOOLEAN", {"default": False, "tooltip": "When running on CPU, use an int8 dynamically quantized model (Linear layers). Converted on first use and cached next to the model files."}),
+                "compile_model": ("BOOLEAN", {"default": False, "tooltip": "Run an inference-only graph through torch.compile. The first run per device compiles, later runs reuse it while the model stays loaded."}),
                 "keep_loaded": ("BOOLEAN", {"default": False, "tooltip": "If false, unload the model from memory after use."}),
             },
         }
@@ -106,12 +123,27 @@ class DN_JoyTaggerNode:
     FUNCTION = "generate_tags"
     CATEGORY = "Dado's Nodes/VLM Nodes"
 
-    def generate_tags(self, image, tag_count, threshold, exclude_tags, underscore_separated, use_cpu, keep_loaded):
-        model_path = download_joytag()
-
-        target_device = "cpu" if use_cpu else ("cuda" if torch.cuda.is_available() else "cpu")
-
-        if self.model is None or self.top_tags is None or (self.model is not None and next(self.model.parameters()).device != target_device):
+    def _load_quantized(self, model_path):
+        with open(Path(model_path) / 'config.json', 'r') as f:
+            image_size = json.load(f)['image_size']
+
+        # fp32 vs int8 is compared on the fixed fixture set at the default threshold, so reports can be reproduced
+        def make_fixtures():
+            return [prepare_image(transforms.ToPILImage()(img.permute(2, 0, 1)), image_size).unsqueeze(0)
+                    for img in accuracy_fixture_images(image_size)]
+
+        return load_quantized_model(
+            "JoyTagger",
+            joytag_weights_file(model_path),
+            lambda: build_joytag_skeleton(model_path),
+            lambda: Models.VisionModel.load_model(Path(model_path), device="cpu"),
+            score_fn=joytag_scores,
+            make_fixtures=make_fixtures,
+            threshold=0.4,
+        )
+
+    def _ensure_model(self, model_path, target_device, quantize):
+        if self.model is None or self.quantized != quantize or next(self.model.parameters()).device != target_device:
             if self.model is not None:
                 print(f"Unloading JoyTagger model from {next(self.model.parameters()).device}...")
                 self.model.cpu()
@@ -119,17 +151,19 @@ class DN_JoyTaggerNode:
                 torch.cuda.empty_cache()
                 self.model = None
             
-            print(f"Loading JoyTagger model to {target_device}...")
-            self.model = Models.VisionModel.load_model(Path(model_path), device=target_device)
+            print(f"Loading JoyTagger model to {target_device}{' (int8)' if quantize else ''}...")
+            if quantize:
+                self.model = self._load_quantized(model_path)
+            else:
+                self.model = Models.VisionModel.load_model(Path(model_path), device=target_device)
             self.model.eval()
             self.current_device = target_device
-
-            with open(Path(model_path) / 'top_tags.txt', 'r') as f:
-                self.top_tags = [line.strip() for line in f.readlines() if line.strip()]
+            self.quantized = quantize
 
             print(f"JoyTagger model loaded successfully on {target_device}")
 
-        pil_image = transforms.ToPILImage()(image[0].permute(2, 0, 1))
+    def _tag_scores(self, image, target_device, compile_model):
+        pil_image = transforms.ToPILImage()(image.permute(2, 0, 1))
 
         with torch.no_grad():
             image_tensor = prepare_image(pil_image, self.model.image_size)
@@ -137,12 +171,37 @@ class DN_JoyTaggerNode:
                 'image': image_tensor.unsqueeze(0).to(target_device),
             }
 
-            with torch.amp.autocast_mode.autocast(target_device, enabled=True):
-                preds = self.model(batch)
-                tag_preds = preds['tags'].sigmoid().cpu()
+            # quantized Linear kernels take fp32 activations, so autocast stays off for them
+            with torch.amp.autocast_mode.autocast(target_device, enabled=not self.quantized):
+                if compile_model and isinstance(self.model, Models.ViT):
+                    autocast_dtype = torch.float32 if self.quantized else torch.get_autocast_dtype(target_device)
+                    tag_logits = Models.compiled_inference(self.model, target_device, autocast_dtype)(batch['image'])
+                else:
+                    tag_logits = self.model(batch)['tags']
+                return tag_logits.sigmoid().float().cpu()[0]
+
+    def generate_tags(self, image, tag_count, threshold, exclude_tags, underscore_separated, use_cpu, keep_loaded, quantize_cpu=False, compile_model=False):
+        model_path = download_joytag()
+
+        target_device = "cpu" if use_cpu else ("cuda" if torch.cuda.is_available() else "cpu")
+        quantize = quantize_cpu and target_device == "cpu"
+
+        # Scores only depend on the pixels and the model variant, so changing the
+        # post-processing inputs re-uses them without loading the model
+        cache_key = score_cache.key(image[0], "joytag-int8" if quantize else "joytag")
+        tag_scores = score_cache.get(cache_key)
+        if tag_scores is None:
+            self._ensure_model(model_path, target_device, quantize)
+            tag_scores = self._tag_scores(image[0], target_device, compile_model)
+            score_cache.put(cache_key, tag_scores)
+
+        if self.top_tags is None:
+            with open(Path(model_path) / 'top_tags.txt', 'r') as f:
+                self.top_tags = [line.strip() for line in f.readlines() if line.strip()]
 
-            scores = {self.top_tags[i]: tag_preds[0][i] for i in range(len(self.top_tags))}
-            filtered_scores = {k: v for k, v in scores.items() if v >= threshold}
+        score_values = tag_scores.tolist()
+        scores = {self.top_tags[i]: score_values[i] for i in range(len(self.top_tags))}
+        filtered_scores = {k: v for k, v in scores.items() if v >= threshold}
 
         top_tags_scores = sorted(filtered_scores.items(), key=lambda x: x[1], reverse=True)
         top_tags_processed = [process_tag(tag) for tag, _ in top_tags_scores]
@@ -165,6 +224,7 @@ class DN_JoyTaggerNode:
                 self.model = None
             self.top_tags = None
             self.current_device = None
+            self.quantized = False
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
         
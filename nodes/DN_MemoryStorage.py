@@ -1,13 +1,31 @@
 import os
 import random
-import json
+import time
 
 from .utils.api_routes import register_operation_handler
+from .utils.memory_storage import MemoryContexts, PersistentStore, SLOT_TYPES
 from aiohttp import web
 from .. import constants
 
 CACHE_DIR = os.path.join(constants.USER_DATA_DIR, "memory_storage")
-DN_STORAGE_DATA = {}
+# storage_key -> key -> text, and storage_key -> (TYPED_KEY, key) -> (slot type, value) with the objects passed in, never copied
+DN_STORAGE_DATA = MemoryContexts()
+TYPED_KEY = "typed"
+PERSISTENT_STORE = PersistentStore(CACHE_DIR)
+TTL_INPUT = ("INT", {"default": 0, "min": 0, "max": 31536000, "tooltip": "Seconds until a set value expires, in memory and on disk; 0 keeps it"})
+
+
+def expiry(ttl_seconds):
+    return time.time() + ttl_seconds if ttl_seconds else None
+
+def store_in_memory(storage_key, key, memory_key, value, expires_at, persistent):
+    """Keep a set value in memory; one larger than a context's byte budget is an error unless it goes to disk"""
+    if DN_STORAGE_DATA.set(storage_key, memory_key, value, expires_at):
+        return
+    message = f"Memory Storage: the value of '{key}' is larger than the {DN_STORAGE_DATA.max_bytes} byte budget of a context"
+    if not persistent:
+        raise ValueError(f"{message}; enable persistent to keep it on disk")
+    print(f"{message}, it is kept on disk only")
 
 class DN_MemoryStorage:
     @classmethod
@@ -22,6 +40,7 @@ class DN_MemoryStorage:
             },
             "optional": {
                 "input": ("STRING", {"forceInput": True}),
+                "ttl_seconds": TTL_INPUT,
             },
             "hidden": {
                 "unique_id": "UNIQUE_ID",
@@ -34,7 +53,7 @@ class DN_MemoryStorage:
     CATEGORY = "Dado's Nodes/Memory Storage"
     OUTPUT_NODE = True
 
-    def execute(self, root_graph_id, mode, context, key, persistent, input=None, unique_id=None):
+    def execute(self, root_graph_id, mode, context, key, persistent, input=None, ttl_seconds=0, unique_id=None):
         if key == "":
             raise ValueError("Empty key")
 
@@ -42,50 +61,98 @@ class DN_MemoryStorage:
 
         value = None
         if mode == "set" and input is not None and input.strip() != "":
-            if storage_key not in DN_STORAGE_DATA:
-                DN_STORAGE_DATA[storage_key] = {}
-            DN_STORAGE_DATA[storage_key][key] = input
-            value = input
-            
+            expires_at = expiry(ttl_seconds)
             if persistent:
-                file_path = os.path.join(CACHE_DIR, f"{storage_key}.json")
-                data = {}
-                if os.path.exists(file_path):
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                data[key] = input
-                os.makedirs(CACHE_DIR, exist_ok=True)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f)
-        
+                PERSISTENT_STORE.set_deferred(storage_key, key, input, expires_at)
+            store_in_memory(storage_key, key, key, input, expires_at, persistent)
+            value = input
+
         if mode == "get":
-            if storage_key not in DN_STORAGE_DATA:
-                DN_STORAGE_DATA[storage_key] = {}
-                
-            if persistent:
-                file_path = os.path.join(CACHE_DIR, f"{storage_key}.json")
-                if os.path.exists(file_path):
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        if key in data:
-                            DN_STORAGE_DATA[storage_key][key] = data[key]
-            
-            if storage_key in DN_STORAGE_DATA and key in DN_STORAGE_DATA[storage_key]:
-                value = DN_STORAGE_DATA[storage_key][key]
+            value = DN_STORAGE_DATA.get(storage_key, key)
+            if value is None and persistent:
+                # Read through: evicted or not yet loaded keys come back from disk and stay in memory
+                entry = PERSISTENT_STORE.get_entry(storage_key, key)
+                if entry is not None:
+                    value = entry[0]
+                    DN_STORAGE_DATA.set(storage_key, key, *entry)
         
         return (value,)
 
     @classmethod
-    def IS_CHANGED(self, root_graph_id, mode, context, key, persistent, input=None, unique_id=None):
+    def IS_CHANGED(self, root_graph_id, mode, context, key, persistent, input=None, ttl_seconds=0, unique_id=None):
         return random.random()
 
-@register_operation_handler
-async def memory_storage_operations(request):
-    data = await request.json()
-    
+class DN_TypedMemoryStorage:
+    """
+    Memory Storage for images, latents and other tensors. Values are kept by reference in memory;
+    persistent ones are written as safetensors files and memory-mapped back on get.
+    """
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "root_graph_id": ("STRING", {"default": ""}),
+                "mode": (["set", "get"], {"default": "set"}),
+                "context": (["workflow", "global"], {"default": "workflow"}),
+                "persistent": ("BOOLEAN", {"default": False}),
+                "key": ("STRING", {"default": ""}),
+            },
+            "optional": {
+                "image": ("IMAGE",),
+                "latent": ("LATENT",),
+                "tensor": ("TENSOR",),
+                "ttl_seconds": TTL_INPUT,
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+            },
+        }
+
+    RETURN_TYPES = SLOT_TYPES
+    RETURN_NAMES = ("image", "latent", "tensor")
+    FUNCTION = "execute"
+    CATEGORY = "Dado's Nodes/Memory Storage"
+    OUTPUT_NODE = True
+
+    def execute(self, root_graph_id, mode, context, key, persistent, image=None, latent=None, tensor=None, ttl_seconds=0, unique_id=None):
+        if key == "":
+            raise ValueError("Empty key")
+
+        storage_key = root_graph_id if context == "workflow" else "global"
+        typed_key = (TYPED_KEY, key)
+
+        slot = None
+        if mode == "set":
+            connected = [(slot_type, value) for slot_type, value in zip(SLOT_TYPES, (image, latent, tensor)) if value is not None]
+            if len(connected) > 1:
+                raise ValueError("Connect only one of image, latent or tensor")
+            if connected:
+                slot = connected[0]
+                expires_at = expiry(ttl_seconds)
+                if persistent:
+                    PERSISTENT_STORE.set_typed_deferred(storage_key, key, *slot, expires_at)
+                store_in_memory(storage_key, key, typed_key, slot, expires_at, persistent)
+
+        if mode == "get":
+            slot = DN_STORAGE_DATA.get(storage_key, typed_key)
+            if slot is None and persistent:
+                entry = PERSISTENT_STORE.get_typed(storage_key, key)
+                if entry is not None:
+                    slot = entry[:2]
+                    DN_STORAGE_DATA.set(storage_key, typed_key, slot, entry[2])
+
+        outputs = [None] * len(SLOT_TYPES)
+        if slot is not None:
+            outputs[SLOT_TYPES.index(slot[0])] = slot[1]
+        return tuple(outputs)
+
+    @classmethod
+    def IS_CHANGED(self, root_graph_id, mode, context, key, persistent, image=None, latent=None, tensor=None, ttl_seconds=0, unique_id=None):
+        return random.random()
+
+@register_operation_handler('dummy_op', 'delete_memory_storage', 'memory_storage_stats')
+async def memory_storage_operations(data):
     operation = data.get('operation')
-    if operation not in ['dummy_op', 'delete_memory_storage']:
-        return None
     
     payload = data.get('payload')
     
@@ -96,15 +163,17 @@ async def memory_storage_operations(request):
     
     if operation == 'delete_memory_storage':
         rootGraphId = payload.get('rootGraphId')
-        if rootGraphId in DN_STORAGE_DATA:
-            del DN_STORAGE_DATA[rootGraphId]
-            print(f"Deleted memory storage for rootGraphId: {rootGraphId}")
+        DN_STORAGE_DATA.discard(rootGraphId)
+        print(f"Deleted memory storage for rootGraphId: {rootGraphId}")
         
-        file_path = os.path.join(CACHE_DIR, f"{rootGraphId}.json")
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            print(f"Deleted memory storage file: {file_path}")
+        PERSISTENT_STORE.delete_context(rootGraphId)
             
         return web.json_response({"status": "success"})
+
+    if operation == 'memory_storage_stats':
+        rootGraphId = (payload or {}).get('rootGraphId')
+        stats = DN_STORAGE_DATA.stats(rootGraphId)
+        stats["persistent"] = PERSISTENT_STORE.stats()
+        return web.json_response(stats)
     
     return web.json_response({"error": "Invalid operation"}, status=400)
@@ -6,6 +6,7 @@ from torchvision import transforms
 import timm
 import json
 import folder_paths
+from .utils.tagger_utils import accuracy_fixture_images, load_quantized_model, score_cache
 from .. import constants
 
 BASE_DIR = constants.BASE_DIR
@@ -88,10 +89,19 @@ def pil_to_rgb(image: Image.Image) -> Image.Image:
 
 class DN_PixAITaggerNode:
     _shared_model = None
+    _shared_quantized = False
 
     @classmethod
-    def _get_shared_model(cls, model_path, target_device):
-        if cls._shared_model is None or (cls._shared_model is not None and next(cls._shared_model.parameters()).device != target_device):
+    def _load_fp32_model(cls, model_path, target_device):
+        model = get_model()
+        states_dict = torch.load(Path(model_path) / "model_v0.9.pth", map_location=target_device, weights_only=True)
+        model.load_state_dict(states_dict)
+        model.to(target_device)
+        return model
+
+    @classmethod
+    def _get_shared_model(cls, model_path, target_device, quantize=False, make_fixtures=None):
+        if cls._shared_model is None or cls._shared_quantized != quantize or (cls._shared_model is not None and next(cls._shared_model.parameters()).device != target_device):
             if cls._shared_model is not None:
                 print(f"Unloading PixAI Tagger model from {next(cls._shared_model.parameters()).device}...")
                 cls._shared_model.cpu()
@@ -99,12 +109,21 @@ class DN_PixAITaggerNode:
                 torch.cuda.empty_cache()
                 cls._shared_model = None
             
-            print(f"Loading PixAI Tagger model to {target_device}...")
-            cls._shared_model = get_model()
-            states_dict = torch.load(Path(model_path) / "model_v0.9.pth", map_location=target_device, weights_only=True)
-            cls._shared_model.load_state_dict(states_dict)
-            cls._shared_model.to(target_device)
+            print(f"Loading PixAI Tagger model to {target_device}{' (int8)' if quantize else ''}...")
+            if quantize:
+                cls._shared_model = load_quantized_model(
+                    "PixAI Tagger",
+                    Path(model_path) / "model_v0.9.pth",
+                    get_model,
+                    lambda: cls._load_fp32_model(model_path, "cpu"),
+                    score_fn=lambda model, image_tensor: model(image_tensor),
+                    make_fixtures=make_fixtures,
+                    threshold=0.3,
+                )
+            else:
+                cls._shared_model = cls._load_fp32_model(model_path, target_device)
             cls._shared_model.eval()
+            cls._shared_quantized = quantize
             print(f"PixAI Tagger model loaded successfully on {target_device}")
         return cls._shared_model
 
@@ -116,6 +135,7 @@ class DN_PixAITaggerNode:
         self.gen_tag_count = 0
         self.character_tag_count = 0
         self.current_device = None  # Track the currently loaded device
+        self.quantized = False
         self.transform = transforms.Compose(
             [
                 transforms.Resize((448, 448)),
@@ -165,6 +185,7 @@ class DN_PixAITaggerNode:
                     "tooltip": "If true, only use the top 1 character tag and its associated IP tags."
                 }),
                 "use_cpu": ("BOOLEAN", {"default": False, "tooltip": "If true, unload the model from GPU and use CPU instead."}),
+                "quantize_cpu": ("BOOLEAN", {"default": False, "tooltip": "When running on CPU, use an int8 dynamically quantized model (Linear layers). Converted on first use and cached next to the model files."}),
                 "keep_loaded": ("BOOLEAN", {"default": False, "tooltip": "If false, unload the model from memory after use."}),
             },
         }
@@ -196,15 +217,37 @@ class DN_PixAITaggerNode:
             if tag_name not in self.tags_to_exclude:
                 target_list.append((tag_name, probs[idx].item()))
 
-    def generate_tags(self, image, threshold_general, threshold_character, tags_count, exclude_tags, underscore_separated, single_char_ip, use_cpu, keep_loaded):
+    def _image_to_tensor(self, image):
+        pil_image = Image.fromarray((image.cpu().numpy() * 255).astype('uint8'))
+        pil_image = pil_to_rgb(pil_image)
+        return self.transform(pil_image).unsqueeze(0)
+
+    def generate_tags(self, image, threshold_general, threshold_character, tags_count, exclude_tags, underscore_separated, single_char_ip, use_cpu, keep_loaded, quantize_cpu=False):
         model_path = download_pixaitagger()
         
         target_device = "cpu" if use_cpu else ("cuda" if torch.cuda.is_available() else "cpu")
-
-        if self.model is None or self.tag_map is None or self.character_ip_mapping is None or self.current_device != target_device:
-            self.model = DN_PixAITaggerNode._get_shared_model(model_path, target_device)
-            self.current_device = target_device
-            
+        quantize = quantize_cpu and target_device == "cpu"
+
+        # Scores only depend on the pixels and the model variant, so changing the
+        # post-processing inputs re-uses them without loading the model
+        cache_key = score_cache.key(image[0], "pixai-v0.9-int8" if quantize else "pixai-v0.9")
+        probs = score_cache.get(cache_key)
+        if probs is None:
+            if self.model is None or self.current_device != target_device or self.quantized != quantize:
+                # fp32 vs int8 is compared on the fixed fixture set at the default threshold, so reports can be reproduced
+                make_fixtures = lambda: [self._image_to_tensor(img) for img in accuracy_fixture_images()]
+                self.model = DN_PixAITaggerNode._get_shared_model(model_path, target_device, quantize, make_fixtures)
+                self.current_device = target_device
+                self.quantized = quantize
+
+            image_tensor = self._image_to_tensor(image[0]).to(target_device)
+            with torch.no_grad():
+                # quantized Linear kernels take fp32 activations, so autocast stays off for them
+                with torch.amp.autocast_mode.autocast(target_device, enabled=not self.quantized):
+                    probs = self.model.forward(image_tensor)[0].float().cpu()
+            score_cache.put(cache_key, probs)
+
+        if self.tag_map is None or self.character_ip_mapping is None:
             tags_file = Path(model_path) / 'tags_v0.9_13k.json'
             mapping_file = Path(model_path) / 'char_ip_map.json'
 
@@ -218,14 +261,7 @@ class DN_PixAITaggerNode:
             with open(mapping_file, 'r') as f:
                 self.character_ip_mapping = json.load(f)
         
-        pil_image = Image.fromarray((image[0].cpu().numpy() * 255).astype('uint8'))
-        
-        pil_image = pil_to_rgb(pil_image)
-        image_tensor = self.transform(pil_image).unsqueeze(0).to(target_device)
-        
         with torch.no_grad():
-            with torch.amp.autocast_mode.autocast(target_device, enabled=True):
-                probs = self.model.forward(image_tensor)[0]
             general_mask = probs[: self.gen_tag_count] > threshold_general
             character_mask = probs[self.gen_tag_count:] > threshold_character
 
@@ -303,6 +339,7 @@ class DN_PixAITaggerNode:
                 self.index_to_tag_map = None
                 self.character_ip_mapping = None
                 self.current_device = None
+                self.quantized = False
                 if torch.cuda.is_available():
                     torch.cuda.empty_cache()
             
@@ -4,8 +4,85 @@
 @description: Node to extract sections from a prompt based on specified markers specified in the WIldcard Prompt Editor Node (or otherwise)
 """
 
-from typing import Dict, Tuple
-import re
+import json
+from typing import Dict, Iterable, List, Tuple
+
+START_MARKER = "START_"
+END_MARKER = "END_"
+
+
+def _mark_tokens(marked_prompt: str, names: Iterable[str]) -> Dict[str, List[Tuple[int, int, bool]]]:
+    """
+    Scan the prompt once for START_/END_ markers and file each one under every requested mark it spells,
+    as (marker start, marker end, is_start). Mark names have no terminator, so a marker is matched
+    against the requested names by length rather than parsed.
+    """
+    tokens = {name: [] for name in names}
+    lengths = sorted({len(name) for name in tokens})
+
+    next_start = marked_prompt.find(START_MARKER)
+    next_end = marked_prompt.find(END_MARKER)
+    while next_start != -1 or next_end != -1:
+        if next_end == -1 or (next_start != -1 and next_start < next_end):
+            position, is_start = next_start, True
+            name_at = next_start + len(START_MARKER)
+            next_start = marked_prompt.find(START_MARKER, next_start + 1)
+        else:
+            position, is_start = next_end, False
+            name_at = next_end + len(END_MARKER)
+            next_end = marked_prompt.find(END_MARKER, next_end + 1)
+
+        for length in lengths:
+            name = marked_prompt[name_at:name_at + length]
+            if name in tokens:
+                tokens[name].append((position, name_at + length, is_start))
+    return tokens
+
+
+def _sections_from_tokens(marked_prompt: str, tokens: List[Tuple[int, int, bool]]) -> List[str]:
+    """
+    Pair one mark's markers with a stack. A nested section of the same mark is part of the enclosing
+    section, with its markers stripped; markers of other marks stay as text. Sections inside an
+    unclosed outer one are still emitted on their own.
+    """
+    sections = []
+    # Open sections: [start position, text pieces, cursor, closed inner sections as (position, text)]
+    stack = []
+    for position, end, is_start in tokens:
+        if is_start:
+            if stack:
+                stack[-1][1].append(marked_prompt[stack[-1][2]:position])
+            stack.append([position, [], end, []])
+        elif stack:
+            start, pieces, cursor, _ = stack.pop()
+            pieces.append(marked_prompt[cursor:position])
+            section = "".join(pieces)
+            # Include comma after END_MARK if present
+            if end < len(marked_prompt) and marked_prompt[end] == ',':
+                section += ','
+            if stack:
+                stack[-1][1].append("".join(pieces))
+                stack[-1][2] = end
+                stack[-1][3].append((start, section))
+            else:
+                sections.append(section)
+
+    if stack:
+        orphans = sorted(inner for frame in stack for inner in frame[3])
+        sections.extend(text for _, text in orphans)
+    return sections
+
+
+def extract_mark_sections(marked_prompt: str, marks: Iterable[str]) -> Dict[str, str]:
+    """
+    Sections of several marks from one scan of the prompt, keyed by mark as given.
+    Each mark's sections are joined with spaces, like DN_PromptSectionsExtractor's output.
+    """
+    marks = [mark or "" for mark in marks]
+    tokens = _mark_tokens(marked_prompt, {mark.upper() for mark in marks})
+    sections = {name: " ".join(_sections_from_tokens(marked_prompt, name_tokens)) for name, name_tokens in tokens.items()}
+    return {mark: sections[mark.upper()] for mark in marks}
+
 
 class DN_PromptSectionsExtractor:
     RETURN_TYPES = ("STRING",)
@@ -26,14 +103,31 @@ class DN_PromptSectionsExtractor:
         }
 
     def extract_marked_sections(self, marked_prompt, mark=None, unique_id=None) -> Tuple[str]:
-        mark = (mark or "").upper()
-        pattern = rf"START_{mark}(.*?)END_{mark}"
-        results = []
-        for m in re.finditer(pattern, marked_prompt, re.DOTALL):
-            end_pos = m.end()
-            section = m.group(1)
-            # Include comma after END_MARK if present
-            if end_pos < len(marked_prompt) and marked_prompt[end_pos] == ',':
-                section += ','
-            results.append(section)
-        return (" ".join(results),)
+        mark = mark or ""
+        return (extract_mark_sections(marked_prompt, [mark])[mark],)
+
+
+class DN_PromptMarksExtractor:
+    """
+    Extracts the sections of several marks at once: a JSON object keyed by mark and
+    a list output with one text per mark, in the order the marks are given
+    """
+    RETURN_TYPES = ("STRING", "STRING",)
+    RETURN_NAMES = ("sections_json", "sections",)
+    OUTPUT_IS_LIST = (False, True,)
+    FUNCTION = "extract_marks"
+    CATEGORY = "Dado's Nodes/Text & Prompt"
+
+    @classmethod
+    def INPUT_TYPES(s) -> Dict[str, dict]:
+        return {
+            "required": {
+                "marked_prompt": ("STRING", {"forceInput": True}),
+                "marks": ("STRING", {"default": "", "multiline": False, "tooltip": "Comma-separated marks, e.g. subject, style, background"})
+            }
+        }
+
+    def extract_marks(self, marked_prompt, marks="") -> Tuple[str, List[str]]:
+        mark_list = list(dict.fromkeys(mark.strip() for mark in marks.split(',') if mark.strip()))
+        sections = extract_mark_sections(marked_prompt, mark_list)
+        return (json.dumps(sections, ensure_ascii=False), [sections[mark] for mark in mark_list])
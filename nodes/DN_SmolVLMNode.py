@@ -2,7 +2,10 @@ import torch
 from PIL import Image
 from pathlib import Path
 from huggingface_hub import snapshot_download
-from transformers import AutoProcessor, AutoModelForVision2Seq, AutoModelForImageTextToText
+from transformers import AutoProcessor, AutoModelForVision2Seq, AutoModelForImageTextToText, TextStreamer, StoppingCriteria, StoppingCriteriaList
+from aiohttp import web
+import comfy.model_management
+from .utils.api_routes import COALESCE_APPEND, register_operation_handler, send_message
 from .. import constants
 
 BASE_DIR = constants.BASE_DIR
@@ -51,12 +54,39 @@ def download_smolvlm(model_key):
     print(f"Model path: {path}")
     return path
 
+class NodeTextStreamer(TextStreamer):
+    """Pushes the decoded text of a running generate call to the node UI"""
+    def __init__(self, tokenizer, node_id, image_index):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.node_id = node_id
+        self.image_index = image_index
+        send_message(node_id, "smolvlm_stream", "started", "", {"image_index": image_index, "text": ""})
+
+    def on_finalized_text(self, text, stream_end=False):
+        if stream_end:
+            send_message(self.node_id, "smolvlm_stream", "finished", "", {"image_index": self.image_index, "text": text})
+        else:
+            # One websocket message per window instead of one per decoded word
+            send_message(self.node_id, "smolvlm_stream", "streaming", "", {"image_index": self.image_index, "text": text}, coalesce=COALESCE_APPEND)
+
+class StopRequested(StoppingCriteria):
+    """Ends generation when the node's stop button was pressed or the queue was interrupted"""
+    def __init__(self, node_id):
+        self.node_id = node_id
+
+    def __call__(self, input_ids, scores, **kwargs):
+        stop = self.node_id in DN_SmolVLMNode.stop_requests or comfy.model_management.processing_interrupted()
+        return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+
 class DN_SmolVLMNode:
+    stop_requests = set()
+
     def __init__(self):
         self.model = None
         self.processor = None
         self.current_device = None  # Track the currently loaded device
         self.current_model_key = None
+        self.prompt_templates = {}  # prompt text -> chat template, per loaded processor
     
     @classmethod
     def INPUT_TYPES(cls):
@@ -72,16 +102,74 @@ class DN_SmolVLMNode:
                     "display": "number"
                 }),
                 "model": (model_options, {}),
+                "batch_size": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 64,
+                    "tooltip": "Number of images from the IMAGE batch described per generate call."
+                }),
                 "use_cpu": ("BOOLEAN", {"default": False, "tooltip": "If true, unload the model from GPU and use CPU instead."}),
                 "keep_loaded": ("BOOLEAN", {"default": False, "tooltip": "If false, unload the model from memory after use."}),
+                "stream_output": ("BOOLEAN", {"default": False, "tooltip": "Show the description in the node while it is generated (one image per generate call). Stopping keeps the text generated so far as output."}),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
             },
         }
 
     RETURN_TYPES = ("STRING",)
+    OUTPUT_IS_LIST = (True,)
     FUNCTION = "describe_image"
     CATEGORY = "Dado's Nodes/VLM Nodes"
 
-    def describe_image(self, image, prompt, max_tokens, model, use_cpu, keep_loaded):
+    def _prompt_template(self, prompt):
+        if prompt not in self.prompt_templates:
+            messages = [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image"},
+                        {"type": "text", "text": prompt}
+                    ]
+                },
+            ]
+            self.prompt_templates[prompt] = self.processor.apply_chat_template(messages, add_generation_prompt=True)
+        return self.prompt_templates[prompt]
+
+    def _describe_batch(self, pil_images, prompt_template, max_tokens, target_device, node_id=None, streamer=None):
+        inputs = self.processor(
+            text=[prompt_template] * len(pil_images),
+            images=[[pil_image] for pil_image in pil_images],
+            padding=True,
+            return_tensors="pt",
+        )
+        inputs = inputs.to(target_device)
+
+        with torch.no_grad():
+            generated_ids = self.model.generate(
+                **inputs,
+                max_new_tokens=max_tokens,
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([StopRequested(node_id)]),
+            )
+
+        # Left padding keeps every prompt ending at the same column, so the new tokens start there
+        generated_texts = self.processor.batch_decode(
+            generated_ids[:, inputs["input_ids"].shape[1]:],
+            skip_special_tokens=True,
+        )
+
+        descriptions = []
+        for generated_text in generated_texts:
+            if "Assistant: " in generated_text:
+                generated_text = generated_text.split("Assistant: ", 1)[1]
+            descriptions.append(generated_text.strip())
+        return descriptions
+
+    def describe_image(self, image, prompt, max_tokens, model, use_cpu, keep_loaded, batch_size=4, stream_output=False, unique_id=None):
+        node_id = str(unique_id)
+        DN_SmolVLMNode.stop_requests.discard(node_id)
+
         model_path = download_smolvlm(model)
 
         target_device = "cpu" if use_cpu else ("cuda" if torch.cuda.is_available() else "cpu")
@@ -101,6 +189,8 @@ class DN_SmolVLMNode:
                 torch.cuda.empty_cache()
 
             self.processor = AutoProcessor.from_pretrained(model_path)
+            self.processor.tokenizer.padding_side = "left"
+            self.prompt_templates = {}
 
             if "SmolVLM2" in model:
                 self.model = AutoModelForImageTextToText.from_pretrained(model_path, trust_remote_code=True).to(target_device)
@@ -111,34 +201,22 @@ class DN_SmolVLMNode:
             self.current_device = target_device
             print(f"{model} model loaded successfully on {target_device}")
 
-        pil_image = Image.fromarray((image[0] * 255).numpy().astype('uint8'))
-
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image"},
-                    {"type": "text", "text": prompt}
-                ]
-            },
-        ]
-
-        prompt_template = self.processor.apply_chat_template(messages, add_generation_prompt=True)
-        inputs = self.processor(text=prompt_template, images=[pil_image], return_tensors="pt")
-        inputs = inputs.to(target_device)
-
-        with torch.no_grad():
-            generated_ids = self.model.generate(**inputs, max_new_tokens=max_tokens)
+        prompt_template = self._prompt_template(prompt)
+        pil_images = [Image.fromarray((img.cpu() * 255).numpy().astype('uint8')) for img in image]
 
-        generated_text = self.processor.batch_decode(
-            generated_ids,
-            skip_special_tokens=True,
-        )[0]
+        # The streamer only handles a single sequence, so streaming describes one image per call
+        step = 1 if stream_output else batch_size
+        descriptions = []
+        for start in range(0, len(pil_images), step):
+            streamer = NodeTextStreamer(self.processor.tokenizer, node_id, start) if stream_output else None
+            descriptions.extend(self._describe_batch(pil_images[start:start + step], prompt_template, max_tokens, target_device, node_id, streamer))
+            comfy.model_management.throw_exception_if_processing_interrupted()
+            if node_id in DN_SmolVLMNode.stop_requests:
+                print(f"SmolVLM generation stopped from the UI after {len(descriptions)} of {len(pil_images)} image(s)")
+                break
+        DN_SmolVLMNode.stop_requests.discard(node_id)
 
-        if "Assistant: " in generated_text:
-            generated_text = generated_text.split("Assistant: ", 1)[1].strip()
-
-        result = (generated_text,)
+        result = (descriptions,)
 
         if not keep_loaded:
             print(f"Unloading SmolVLM model from {self.current_device} after use.")
@@ -149,9 +227,16 @@ class DN_SmolVLMNode:
             if self.processor is not None:
                 del self.processor
                 self.processor = None
+            self.prompt_templates = {}
             self.current_device = None
             self.current_model_key = None
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
 
         return result
+
+@register_operation_handler('smolvlm_stop')
+async def handle_smolvlm_operations(data):
+    """Handle SmolVLM operations using the common message route"""
+    DN_SmolVLMNode.stop_requests.add(str(data.get('id', '')))
+    return web.json_response({"status": "success"})
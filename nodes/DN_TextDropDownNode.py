@@ -57,16 +57,11 @@ class DN_TextDropDownNode:
         
         return f"{selection_key}:{current_selection}"
 
-@register_operation_handler
-async def handle_text_dropdown_operations(request):
+@register_operation_handler('update_selection', 'remove_text_selection')
+async def handle_text_dropdown_operations(data):
     """Handle text dropdown operations using the common message route"""
     try:
-        data = await request.json()
         operation = data.get('operation')
-        
-        if operation not in ['update_selection', 'remove_selection']:
-            return None
-            
         node_id = str(data.get('id', ''))
         payload = data.get('payload', {})
 
@@ -81,7 +76,7 @@ async def handle_text_dropdown_operations(request):
                 
                 return web.json_response({"status": "success"})
         
-        elif operation == 'remove_selection':
+        elif operation == 'remove_text_selection':
             if node_id in DN_TextDropDownNode.selections:
                 del DN_TextDropDownNode.selections[node_id]
             if node_id in DN_TextDropDownNode.entries_map:
@@ -4,6 +4,9 @@ import random
 from typing import Dict, Any, ClassVar, Optional, Tuple
 from aiohttp import web
 from .utils.api_routes import register_operation_handler
+from .wildcardselector import wildcard_ast
+
+ENTRY_WILDCARD_PATTERN = re.compile(r'\{([^{}]+)\}')
 
 class DN_WildcardPromptEditorNode:
     file_cache: ClassVar[Dict[str, str]] = {}
@@ -27,12 +30,14 @@ class DN_WildcardPromptEditorNode:
     CATEGORY = "Dado's Nodes/Text & Prompt"
     
     def parse_wildcards(self, clean_prompt: str) -> list:
-        return self._parse_wildcards_recursive(clean_prompt, "")
+        parsed = wildcard_ast.parse_cached(clean_prompt)
+        return self._build_wildcards(clean_prompt, parsed.wildcards, 0, "")
     
     def _extract_entry_wildcards(self, option_text: str, parent_child_index: str) -> list:
+        # Only used for options of a pipe-less wildcard, which come from a plain split('|') and may
+        # hold unbalanced braces, so innermost "{...}" are matched textually rather than parsed
         entry_wildcards = []
-        wildcard_pattern = r'\{([^{}]+)\}'
-        matches = list(re.finditer(wildcard_pattern, option_text))
+        matches = list(ENTRY_WILDCARD_PATTERN.finditer(option_text))
         
         for i, match in enumerate(matches):
             entry_wildcard = {
@@ -47,39 +52,54 @@ class DN_WildcardPromptEditorNode:
         
         return entry_wildcards
     
-    def _parse_wildcards_recursive(self, clean_prompt: str, parent_index: str) -> list:
+    def _collect_entry_wildcards(self, source: str, wildcards: list, base: int, parent_child_index: str) -> list:
+        # Entry wildcards are the innermost "{...}" anywhere inside an option
+        entry_wildcards = []
+        for node in wildcards:
+            for inner in node.innermost():
+                entry_wildcard = {
+                    'index': f"{parent_child_index}.e{len(entry_wildcards) + 1}",
+                    'original': inner.text(source),
+                    'position': inner.start - base,
+                    'options': [''] + [opt.strip() for opt in inner.inner_text(source).split('|')],
+                    'selected': '',
+                    'is_entry_wildcard': True
+                }
+                entry_wildcards.append(entry_wildcard)
+        
+        return entry_wildcards
+    
+    def _build_wildcards(self, source: str, nodes: list, base: int, parent_index: str) -> list:
+        """Build the editor's wildcard dicts from AST nodes; positions are relative to base"""
         wildcards = []
-        matches = self._find_wildcard_matches(clean_prompt)
         
-        for i, (start, end, content) in enumerate(matches):
+        for i, node in enumerate(nodes):
             current_index = f"{parent_index}.{i + 1}" if parent_index else str(i + 1)
             
             wildcard = {
                 'index': current_index,
-                'original': clean_prompt[start:end],
-                'position': start,
+                'original': node.text(source),
+                'position': node.start - base,
                 'options': [''],
                 'selected': '',
                 'children': {},
                 'entry_wildcards': {}
             }
             
-            if self._has_top_level_pipes(content):
-                options = self._split_top_level_options(content)
-                wildcard['options'].extend(options)
+            if len(node.options) > 1:
+                options = node.choices
+                wildcard['options'].extend(option.text(source) for option in options)
                 
                 for j, option in enumerate(options):
-                    if self._contains_wildcards(option):
+                    if option.wildcards:
                         child_index = f"{current_index}.{j + 1}"
-                        child_wildcards = self._parse_wildcards_recursive(option, child_index)
-                        if child_wildcards:
-                            wildcard['children'][str(j + 1)] = child_wildcards
+                        wildcard['children'][str(j + 1)] = self._build_wildcards(source, option.wildcards, option.start, child_index)
                 
-                    entry_wildcards = self._extract_entry_wildcards(option, f"{current_index}.{j + 1}")
+                    entry_wildcards = self._collect_entry_wildcards(source, option.wildcards, option.start, f"{current_index}.{j + 1}")
                     if entry_wildcards:
                         wildcard['entry_wildcards'][str(j + 1)] = entry_wildcards
             else:
-                simple_options = [opt.strip() for opt in content.split('|')]
+                simple_options = [opt.strip() for opt in node.inner_text(source).split('|')]
                 wildcard['options'].extend(simple_options)
                 
                 for j, option in enumerate(simple_options):
@@ -92,66 +112,8 @@ class DN_WildcardPromptEditorNode:
         
         return wildcards
 
-    def _find_wildcard_matches(self, clean_prompt: str) -> list:
-        matches = []
-        i = 0
-        while i < len(clean_prompt):
-            if clean_prompt[i] == '{':
-                start = i
-                brace_count = 1
-                i += 1
-                
-                while i < len(clean_prompt) and brace_count > 0:
-                    if clean_prompt[i] == '{':
-                        brace_count += 1
-                    elif clean_prompt[i] == '}':
-                        brace_count -= 1
-                    i += 1
-                
-                if brace_count == 0:
-                    end = i
-                    content = clean_prompt[start + 1:end - 1]
-                    matches.append((start, end, content))
-                else:
-                    break
-            else:
-                i += 1
-        
-        return matches
-    
     def _has_top_level_pipes(self, content: str) -> bool:
-        brace_count = 0
-        for char in content:
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-            elif char == '|' and brace_count == 0:
-                return True
-        return False
-    
-    def _split_top_level_options(self, content: str) -> list:
-        options = []
-        current_option = ""
-        brace_count = 0
-        
-        for char in content:
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-            elif char == '|':
-                if brace_count == 0:
-                    options.append(current_option.strip())
-                    current_option = ""
-                    continue
-            
-            current_option += char
-        
-        if current_option.strip():
-            options.append(current_option.strip())
-        
-        return options
+        return wildcard_ast.has_top_level(content, '|')
     
     def _contains_wildcards(self, clean_prompt: str) -> bool:
         return '{' in clean_prompt and '}' in clean_prompt
@@ -194,8 +156,7 @@ class DN_WildcardPromptEditorNode:
         return wildcards
     
     def apply_wildcards_to_text(self, clean_prompt: str, selections: Dict) -> str:
-        processed_selections = self._flatten_selections_for_processing(selections)
-        return self._apply_wildcards_to_text_recursive(clean_prompt, processed_selections, "")
+        return self.resolve_prompt(clean_prompt, selections)[0]
     
     def _flatten_selections_for_processing(self, selections: Dict) -> Dict:
         flattened = {}
@@ -204,53 +165,6 @@ class DN_WildcardPromptEditorNode:
                 flattened[key] = value['selected']
         return flattened
     
-    def _apply_wildcards_to_text_recursive(self, clean_prompt: str, selections: Dict, parent_index: str) -> str:
-        matches = self._find_wildcard_matches(clean_prompt)
-        
-        modified_text = clean_prompt
-        offset = 0
-        
-        for i, (start, end, content) in enumerate(matches):
-            current_index = f"{parent_index}.{i + 1}" if parent_index else str(i + 1)
-            
-            selected_value = selections.get(current_index)
-            if selected_value:
-                if self._has_top_level_pipes(content):
-                    options = self._split_top_level_options(content)
-                    if selected_value in options:
-                        selected_option_index = options.index(selected_value) + 1
-                        child_index = f"{current_index}.{selected_option_index}"
-                        
-                        replacement = self._apply_wildcards_to_text_recursive(selected_value, selections, child_index)
-                        
-                        replacement = self._apply_entry_wildcards_to_text(replacement, selections, child_index)
-                    else:
-                        replacement = clean_prompt[start:end]
-                else:
-                    replacement = self._apply_entry_wildcards_to_text(selected_value, selections, current_index + ".1")
-                
-                adjusted_start = start + offset
-                adjusted_end = end + offset
-                modified_text = modified_text[:adjusted_start] + replacement + modified_text[adjusted_end:]
-                offset += len(replacement) - (end - start)
-        
-        return modified_text
-    
-    def _apply_entry_wildcards_to_text(self, clean_prompt: str, selections: Dict, base_index: str) -> str:
-        """Apply entry wildcard selections to clean_prompt"""
-        modified_text = clean_prompt
-        entry_matches = list(re.finditer(r'\{([^{}]+)\}', clean_prompt))
-        
-        for i, match in enumerate(reversed(entry_matches)):
-            entry_index = f"{base_index}.e{len(entry_matches) - i}"
-            selected_value = selections.get(entry_index)
-            
-            if selected_value:
-                start, end = match.span()
-                modified_text = modified_text[:start] + selected_value + modified_text[end:]
-        
-        return modified_text
-    
     def process_prompt(self, wildcards_prompt="", wildcards_selections="", unique_id=None):
         if not wildcards_prompt.strip():
             return ('', '')
@@ -259,155 +173,138 @@ class DN_WildcardPromptEditorNode:
         except json.JSONDecodeError:
             selections = {}
 
-        # Apply wildcards to get clean text (no marks)
-        clean_prompt = self.apply_wildcards_to_text(wildcards_prompt, selections)
-        
-        # Apply markings using the new position-based system
-        marked_prompt = self.apply_markings_during_resolution(wildcards_prompt, selections)
-        
-        return (clean_prompt, marked_prompt)
+        return self.resolve_prompt(wildcards_prompt, selections)
 
-    def apply_markings_during_resolution(self, original_prompt: str, selections: Dict) -> str:
-        """Apply markings during wildcard resolution to handle position tracking"""
-        # Calculate effective marks with inheritance
+    def resolve_prompt(self, prompt: str, selections: Dict) -> Tuple[str, str]:
+        """
+        Resolve the selections into the clean prompt and the marked prompt in one traversal of the
+        wildcard tree, appending both outputs to list builders instead of re-slicing strings
+        """
+        selected = self._flatten_selections_for_processing(selections)
         effective_marks = self._calculate_effective_marks(selections)
-        
-        # Process wildcards and apply marks simultaneously
-        processed_selections = self._flatten_selections_for_processing(selections)
-        return self._apply_wildcards_and_marks_recursive(original_prompt, processed_selections, effective_marks, "", selections)
+        clean, marked = [], []
+        self._resolve_into(
+            prompt, 0, len(prompt), wildcard_ast.parse_cached(prompt).wildcards, "",
+            selected, effective_marks, clean, marked
+        )
+        return ''.join(clean), ''.join(marked)
 
-    def _apply_wildcards_and_marks_recursive(self, text: str, selections: Dict, effective_marks: Dict, parent_index: str, full_selections: Dict) -> str:
-        """Apply wildcards and marks simultaneously to handle position tracking"""
-        matches = self._find_wildcard_matches(text)
-        
-        modified_text = text
-        offset = 0
-        
-        for i, (start, end, content) in enumerate(matches):
+    def _resolve_into(self, source: str, start: int, end: int, wildcards: list, parent_index: str,
+                      selected: Dict, effective_marks: Dict, clean: list, marked: list):
+        """Append the resolution of source[start:end], whose top-level wildcards are given, to both builders"""
+        position = start
+        for i, wildcard in enumerate(wildcards):
             current_index = f"{parent_index}.{i + 1}" if parent_index else str(i + 1)
             
-            # Get selected value
-            selected_value = selections.get(current_index, '')
+            between = source[position:wildcard.start]
+            clean.append(between)
+            marked.append(between)
             
+            selected_value = selected.get(current_index)
             if selected_value:
-                replacement = self._process_wildcard_with_marks(
-                    text, start, end, content, current_index, selected_value, 
-                    selections, effective_marks, full_selections
+                clean_replacement, marked_replacement = self._resolve_selection(
+                    source, wildcard, current_index, selected_value, selected, effective_marks
                 )
             else:
                 # No selection - keep the original wildcard text
-                replacement = text[start:end]
-            
-            # Apply mark to this wildcard if it has one AND it's not empty
-            effective_mark = effective_marks.get(current_index)
+                clean_replacement = marked_replacement = wildcard.text(source)
             
-            if effective_mark and effective_mark.strip():
-                replacement = f"START_{effective_mark.upper()}{replacement}END_{effective_mark.upper()}"
-            
-            # Replace in text
-            adjusted_start = start + offset
-            adjusted_end = end + offset
-            modified_text = modified_text[:adjusted_start] + replacement + modified_text[adjusted_end:]
-            offset += len(replacement) - (end - start)
+            clean.append(clean_replacement)
+            marked.append(self._wrap_mark(marked_replacement, effective_marks.get(current_index)))
+            position = wildcard.end
         
-        return modified_text
+        tail = source[position:end]
+        clean.append(tail)
+        marked.append(tail)
 
-    def _process_wildcard_with_marks(
-            self, text: str, start: int, end: int, content: str, 
-            current_index: str, selected_value: str, 
-            selections: Dict, effective_marks: Dict, full_selections: Dict) -> str:
-        """Process a single wildcard with mark support"""
-        
-        if self._has_top_level_pipes(content):
-            options = self._split_top_level_options(content)
-            if selected_value in options:
-                selected_option_index = options.index(selected_value) + 1
-                child_index = f"{current_index}.{selected_option_index}"
-                
-                # Recursively process the selected value
-                replacement = self._apply_wildcards_and_marks_recursive(
-                    selected_value, selections, effective_marks, child_index, full_selections
-                )
-                
-                # Process entry wildcards
-                replacement = self._apply_entry_wildcards_with_marks(
-                    replacement, selections, effective_marks, child_index, full_selections
-                )
+    def _resolve_selection(self, source: str, wildcard: wildcard_ast.Wildcard, current_index: str,
+                           selected_value: str, selected: Dict, effective_marks: Dict) -> Tuple[str, str]:
+        """Clean and marked text of one selected wildcard"""
+        if len(wildcard.options) > 1:
+            for j, choice in enumerate(wildcard.choices):
+                if choice.text(source) == selected_value:
+                    break
             else:
-                replacement = text[start:end]  # Keep original if not found
-        else:
-            # For simple options (like {correctA|correctB}), just use the selected value
-            replacement = selected_value
+                # Keep original if the selection is not one of the options
+                original = wildcard.text(source)
+                return original, original
             
-            # Process any entry wildcards within this selected value
-            replacement = self._apply_entry_wildcards_with_marks(
-                replacement, selections, effective_marks, current_index + ".1", full_selections
+            child_index = f"{current_index}.{j + 1}"
+            clean, marked = [], []
+            self._resolve_into(
+                source, choice.start, choice.end, choice.wildcards, child_index,
+                selected, effective_marks, clean, marked
             )
+            clean_text, marked_text = ''.join(clean), ''.join(marked)
+        else:
+            # For simple options (like {correctA|correctB}), just use the selected value
+            child_index = current_index + ".1"
+            clean_text = marked_text = selected_value
         
-        return replacement
+        # Entry wildcards are whatever innermost "{...}" remain in the resolved option
+        return (
+            self._apply_entry_selections(clean_text, child_index, selected, None),
+            self._apply_entry_selections(marked_text, child_index, selected, effective_marks)
+        )
 
-    def _apply_entry_wildcards_with_marks(self, text: str, selections: Dict, effective_marks: Dict, base_index: str, full_selections: Dict) -> str:
-        """Apply entry wildcard selections with marks"""
-        modified_text = text
-        entry_matches = list(re.finditer(r'\{([^{}]+)\}', text))
-        
-        # Process in reverse order to maintain positions
-        for i, match in enumerate(reversed(entry_matches)):
-            entry_index = f"{base_index}.e{len(entry_matches) - i}"
-            
-            selected_value = selections.get(entry_index, '')
-            
+    def _apply_entry_selections(self, text: str, base_index: str, selected: Dict, effective_marks: Optional[Dict]) -> str:
+        """Replace selected entry wildcards of text, marking them when effective_marks is given"""
+        pieces = []
+        position = 0
+        for i, match in enumerate(ENTRY_WILDCARD_PATTERN.finditer(text)):
+            entry_index = f"{base_index}.e{i + 1}"
+            selected_value = selected.get(entry_index)
             if selected_value:
-                replacement = selected_value
-                
-                # Apply mark if this entry wildcard has one AND it's not empty
-                effective_mark = effective_marks.get(entry_index)
-                if effective_mark and effective_mark.strip():  # ← Added strip() check
-                    replacement = f"START_{effective_mark.upper()}{replacement}END_{effective_mark.upper()}"
-                
-                start, end = match.span()
-                modified_text = modified_text[:start] + replacement + modified_text[end:]
-        
-        return modified_text
+                if effective_marks is not None:
+                    selected_value = self._wrap_mark(selected_value, effective_marks.get(entry_index))
+                pieces.append(text[position:match.start()])
+                pieces.append(selected_value)
+                position = match.end()
+        
+        if not pieces:
+            return text
+        pieces.append(text[position:])
+        return ''.join(pieces)
+
+    @staticmethod
+    def _wrap_mark(text: str, mark: Optional[str]) -> str:
+        if mark and mark.strip():
+            return f"START_{mark.upper()}{text}END_{mark.upper()}"
+        return text
 
     def _calculate_effective_marks(self, selections: Dict) -> Dict[str, str]:
-        """Calculate effective marks for each wildcard using inheritance"""
-        print(f"DEBUG: Input selections: {selections}")  # DEBUG
-        effective_marks = {}
-        
-        # First pass: collect direct marks
-        direct_marks = {}
-        for wildcard_index, selection_data in selections.items():
-            if isinstance(selection_data, dict) and 'mark' in selection_data:
-                mark = selection_data.get('mark', '')
-                direct_marks[wildcard_index] = mark
-                print(f"DEBUG: Found mark for {wildcard_index}: '{mark}'")  # DEBUG
-        
-        print(f"DEBUG: Direct marks: {direct_marks}")  # DEBUG
-        
-        # Second pass: apply inheritance
-        for wildcard_index in selections.keys():
+        """
+        Effective mark of every selection: its own mark if it has one, otherwise the mark of its
+        nearest marked ancestor. Resolved top-down, so each index looks up its closest recorded ancestor once.
+        """
+        direct_marks = {
+            wildcard_index: selection_data.get('mark', '')
+            for wildcard_index, selection_data in selections.items()
+            if isinstance(selection_data, dict) and 'mark' in selection_data
+        }
+        
+        # Mark of the nearest marked ancestor-or-self for every selection index, shallowest first
+        nearest_marks = {}
+        for wildcard_index in sorted(selections, key=lambda index: index.count('.')):
             if wildcard_index in direct_marks:
-                effective_marks[wildcard_index] = direct_marks[wildcard_index]
-            else:
-                inherited_mark = self._find_inherited_mark(wildcard_index, direct_marks)
-                if inherited_mark:
-                    effective_marks[wildcard_index] = inherited_mark
+                nearest_marks[wildcard_index] = direct_marks[wildcard_index]
+                continue
+            mark = None
+            parent_index = wildcard_index
+            while '.' in parent_index:
+                parent_index = parent_index.rsplit('.', 1)[0]
+                if parent_index in nearest_marks:
+                    mark = nearest_marks[parent_index]
+                    break
+            nearest_marks[wildcard_index] = mark
         
-        print(f"DEBUG: Final effective marks: {effective_marks}")  # DEBUG
-        return effective_marks
+        return {
+            wildcard_index: mark for wildcard_index, mark in nearest_marks.items()
+            if wildcard_index in direct_marks or mark
+        }
 
-    def _find_inherited_mark(self, wildcard_index: str, direct_marks: Dict[str, str]) -> Optional[str]:
-        """Find the most specific parent mark for inheritance"""
-        index_parts = wildcard_index.split('.')
-        
-        # Walk up the hierarchy looking for a marked parent
-        for i in range(len(index_parts) - 1, 0, -1):
-            parent_index = '.'.join(index_parts[:i])
-            if parent_index in direct_marks:
-                return direct_marks[parent_index]
-        
-        return None
+    def apply_markings_during_resolution(self, original_prompt: str, selections: Dict) -> str:
+        return self.resolve_prompt(original_prompt, selections)[1]
 
     # Keep the old apply_markings_to_text method for backward compatibility but use new system
     def apply_markings_to_text(self, clean_prompt: str, selections: Dict) -> str:
@@ -588,20 +485,13 @@ class TextLoaderOperations:
             "selections_json": "{}"
         })
 
-@register_operation_handler
-async def handle_wildcard_prompt_editor_operations(request):
+@register_operation_handler(
+    'update_state', 'update_content', 'get_content',
+    'update_wildcard_selection', 'reset_wildcards'
+)
+async def handle_wildcard_prompt_editor_operations(data):
     try:
-        data = await request.json()
         operation = data.get('operation')
-        
-        valid_operations = [
-            'update_state', 'update_content', 'get_content',
-            'update_wildcard_selection', 'reset_wildcards'
-        ]
-        
-        if operation not in valid_operations:
-            return None  # ← Let other handlers try
-        
         node_id = str(data.get('id', ''))
         payload = data.get('payload', {})
         
@@ -4,13 +4,13 @@
 @description: Processes and catalogs sections and wildcards, mapping their structure and relationships for UI representation.
 """
 import json
-import os
-import folder_paths
+import xxhash
 from typing import Dict, Any, ClassVar
 from aiohttp import web
-from dynamicprompts.generators import RandomPromptGenerator
 from .utils.api_routes import register_operation_handler
+from .utils.dynamicprompts_utils import generate_prompts
 from .wildcardselector.structure_utils import WildcardStructureCreation
+from .wildcardselector.combinations import combination_space
 
 class DN_WildcardSelectorComposerV2:
     node_state: ClassVar[Dict[str, Dict[str, Any]]] = {}
@@ -40,65 +40,104 @@ class DN_WildcardSelectorComposerV2:
         process_wildcards = self.node_state.get(unique_id, {}).get("process_wildcards", False)
 
         if process_wildcards and wildcards_prompt:
-            generator = RandomPromptGenerator()
-            processed_prompt = generator.generate(wildcards_prompt)[0]
+            processed_prompt = generate_prompts(wildcards_prompt, [seed] if seed is not None else None)[0]
 
         return (wildcards_prompt, marked_prompt, processed_prompt)
     
     # ! IS_CHANGED is missing with a random number generator in order to call this node again even if the input prompt is the same 
     
+    @classmethod
+    def build_wildcards_structure(cls, node_id: str, content: str, old_structure_json: str = "") -> Dict[str, Any]:
+        cls.node_state[node_id]['wildcards_prompt'] = content
+
+        if not content:
+            cls.node_state[node_id].pop('structure_snapshot', None)
+            return {}
+
+        creator = WildcardStructureCreation()
+        new_structure = creator.create_json_structure(content)
+        cls.node_state[node_id]['structure_snapshot'] = creator.snapshot(new_structure)
+        try:
+            old_structure = json.loads(old_structure_json) if old_structure_json else {}
+            creator.merge_selected(old_structure, new_structure)
+        except Exception:
+            pass  # If merging fails, just use new_structure
+        return new_structure
+
     @classmethod
     def update_wildcards_prompt(cls, node_id: str, content: str, old_structure_json: str = "") -> str:
+        new_structure = cls.build_wildcards_structure(node_id, content, old_structure_json)
+        return WildcardStructureCreation.generate_structure_data(new_structure)
+
+    @classmethod
+    def update_wildcards_prompt_diff(cls, node_id: str, content: str, revision: str = None, old_structure_json: str = "", compact: bool = False) -> Dict[str, Any]:
+        """
+        Incremental update_wildcards_prompt: when the client's revision is the prompt of the last
+        structure built for this node, only the edited sections are analysed again and the response
+        carries the structural diff; otherwise it carries the full structure.
+        Selections live in the client, which keeps them for every node the diff does not remove.
+        With compact, structures and upserted nodes use the compact wire format of structure_utils.
+        """
+        snapshot = cls.node_state[node_id].get('structure_snapshot')
+        new_revision = structure_revision(content)
+
+        if not content or snapshot is None or revision != structure_revision(snapshot['text']):
+            new_structure = cls.build_wildcards_structure(node_id, content, old_structure_json)
+            if compact:
+                return {"revision": new_revision, "wildcard_structure_compact": WildcardStructureCreation.compact_structure(new_structure, content)}
+            return {"revision": new_revision, "wildcard_structure_data": WildcardStructureCreation.generate_structure_data(new_structure)}
+
         cls.node_state[node_id]['wildcards_prompt'] = content
+        creator = WildcardStructureCreation()
+        new_structure, diff = creator.update_json_structure(content, snapshot)
+        cls.node_state[node_id]['structure_snapshot'] = creator.snapshot(new_structure)
+        if compact:
+            diff["upserted"] = {"t": content, "n": creator.compact_nodes(diff["upserted"], content)}
+        return {"revision": new_revision, "wildcard_structure_diff": diff}
 
-        structure_data = ""
-        if content:
-            creator = WildcardStructureCreation()
-            new_structure = creator.create_json_structure(content)
-            try:
-                old_structure = json.loads(old_structure_json) if old_structure_json else {}
-                creator.merge_selected(old_structure, new_structure)
-            except Exception:
-                pass  # If merging fails, just use new_structure
-            structure_data = creator.generate_structure_data(new_structure)
-        else:
-            structure_data = "{}"
-        return structure_data
-
-
-@register_operation_handler
-async def handle_wildcard_selector_composer_operations(request):
+
+MAX_SAMPLED_COMBINATIONS = 1000
+
+
+def structure_revision(content: str) -> str:
+    return xxhash.xxh64(content.encode()).hexdigest()
+
+
+def compact_dumps(data) -> str:
+    return json.dumps(data, separators=(',', ':'))
+
+
+@register_operation_handler(
+    'update_wildcards_prompt', 'process_wildcards',
+    'count_combinations', 'sample_combinations'
+)
+async def handle_wildcard_selector_composer_operations(data):
     try:
-        data = await request.json()
         operation = data.get('operation')
         node_id = str(data.get('id', ''))
 
-        valid_operations = [
-            'update_wildcards_prompt', 'process_wildcards'
-        ]
-        
-        # Log ComfyUI user folder paths
-        try:
-            user_dir_abs = folder_paths.get_user_directory()
-            user_dir_rel = os.path.relpath(user_dir_abs)
-            current_dir = os.getcwd()
-            
-            print(f"ComfyUI User Directory - Absolute: {user_dir_abs}")
-            print(f"ComfyUI User Directory - Relative: {user_dir_rel} (relative to: {current_dir})")
-        except Exception as e:
-            print(f"Failed to get ComfyUI user directory: {str(e)}")
-        
-        if operation not in valid_operations:
-            return None
-
         if node_id not in DN_WildcardSelectorComposerV2.node_state:
             DN_WildcardSelectorComposerV2.node_state[node_id] = {}
 
         if operation == 'update_wildcards_prompt':
             payload = data.get('payload', {})
             content = payload.get('content', '')
-            old_structure_json = payload.get('wildcards_structure_data', '')
 
+            if payload.get('accept_diff'):
+                update = DN_WildcardSelectorComposerV2.update_wildcards_prompt_diff(
+                    node_id, content, payload.get('revision'), payload.get('wildcards_structure_data', ''),
+                    compact=bool(payload.get('compact'))
+                )
+                response = web.json_response({
+                    "status": "success",
+                    "message": "Content updated successfully",
+                    **update
+                }, dumps=compact_dumps)
+                if payload.get('compress'):
+                    response.enable_compression()
+                return response
+
+            old_structure_json = payload.get('wildcards_structure_data', '')
             structure_data = DN_WildcardSelectorComposerV2.update_wildcards_prompt(node_id, content, old_structure_json)
 
             return web.json_response({
@@ -113,6 +152,28 @@ async def handle_wildcard_selector_composer_operations(request):
             DN_WildcardSelectorComposerV2.node_state[node_id]["process_wildcards"] = state
             return web.json_response({"status": "success", "process_wildcards": state})
 
+        # Combination counts and indices can exceed JavaScript's safe integers, so they travel as strings
+        if operation == 'count_combinations':
+            payload = data.get('payload', {})
+            content = payload.get('content', DN_WildcardSelectorComposerV2.node_state[node_id].get('wildcards_prompt', ''))
+            space = combination_space(content)
+            return web.json_response({"status": "success", "combinations": str(space.count)})
+
+        if operation == 'sample_combinations':
+            payload = data.get('payload', {})
+            content = payload.get('content', DN_WildcardSelectorComposerV2.node_state[node_id].get('wildcards_prompt', ''))
+            space = combination_space(content)
+            if 'indices' in payload:
+                indices = [int(index) for index in payload['indices']][:MAX_SAMPLED_COMBINATIONS]
+            else:
+                count = min(int(payload.get('count', 1)), MAX_SAMPLED_COMBINATIONS)
+                indices = space.sample(count, int(payload.get('seed', 0)))
+            try:
+                samples = [{"index": str(index), "prompt": space.combination(index)} for index in indices]
+            except IndexError as e:
+                return web.json_response({"status": "error", "message": str(e)}, status=400)
+            return web.json_response({"status": "success", "combinations": str(space.count), "samples": samples})
+
     except Exception as e:
         return web.json_response(
             {"status": "error", "message": str(e)},
@@ -0,0 +1,64 @@
+from itertools import count as count_from, tee
+from .utils.dynamicprompts_utils import iter_prompts, prompt_generator
+
+class DN_WildcardsBatchProcessor:
+    """
+    Expands one wildcard template into a list of prompts in a single execution,
+    either one per seed of a seed range or exhaustively (combinatorial) up to a cap
+    """
+    # With de-duplication, how many seeds per requested prompt are tried before giving up
+    DEDUPE_ATTEMPTS_PER_PROMPT = 10
+
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "text": ("STRING", {"multiline": True, "tooltip": "Text with wildcards to process"}),
+                "mode": (["seed_range", "combinatorial"], {"default": "seed_range", "tooltip": "seed_range: one random expansion per seed. combinatorial: every combination in order, up to count"}),
+                "seed": ("INT", {"default": 0, "min": 0, "max": 2000000000, "tooltip": "First seed of the range (seed_range mode)"}),
+                "count": ("INT", {"default": 16, "min": 1, "max": 100000, "tooltip": "Number of prompts to emit; the cap on combinations in combinatorial mode"}),
+                "deduplicate": ("BOOLEAN", {"default": False, "tooltip": "Skip prompts already emitted; in seed_range mode further seeds are tried to fill the count"}),
+                "use_attention": ("BOOLEAN", {"default": False, "tooltip": "Use attention generator for emphasis. seed_range mode only: combinatorial mode ignores it and emits the plain combinations"}),
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "INT",)
+    RETURN_NAMES = ("prompts", "seeds",)
+    OUTPUT_IS_LIST = (True, True,)
+    FUNCTION = "process_wildcards_batch"
+    CATEGORY = "Dado's Nodes/Text & Prompt"
+
+    def process_wildcards_batch(self, text, mode, seed, count, deduplicate, use_attention):
+        if not text:
+            return ([], [])
+
+        if mode == "combinatorial":
+            # Combinations are distinct by construction except for templates with repeated options
+            indexed = enumerate(prompt_generator.iter_combinations(text, None if deduplicate else count))
+        else:
+            seeds, prompt_seeds = tee(count_from(seed) if deduplicate else range(seed, seed + count))
+            indexed = zip(seeds, iter_prompts(text, prompt_seeds, use_attention))
+
+        prompts = []
+        emitted_seeds = []
+        seen = set()
+        attempts = 0
+        max_attempts = count * self.DEDUPE_ATTEMPTS_PER_PROMPT
+        # Pulled lazily, so neither the seed range nor the cartesian product is expanded beyond what is emitted
+        for prompt_seed, prompt in indexed:
+            attempts += 1
+            if deduplicate:
+                if prompt in seen:
+                    if attempts >= max_attempts:
+                        break
+                    continue
+                seen.add(prompt)
+            prompts.append(prompt)
+            emitted_seeds.append(prompt_seed)
+            if len(prompts) >= count or (deduplicate and attempts >= max_attempts):
+                break
+
+        return (prompts, emitted_seeds)
@@ -1,5 +1,4 @@
-from dynamicprompts.generators import RandomPromptGenerator
-from dynamicprompts.generators.attentiongenerator import AttentionGenerator
+from .utils.dynamicprompts_utils import generate_prompts
 
 class DN_WildcardsProcessor:
     
@@ -25,21 +24,8 @@ class DN_WildcardsProcessor:
         if not text:
             return (text, seed)
         
-        generator = RandomPromptGenerator()
-        
-        if use_attention:
-            attention_generator = AttentionGenerator(generator)
-            prompts = attention_generator.generate(text, num_prompts=1, seeds=seed)
-            
-            fixed_prompts = []
-            for prompt in prompts:
-                import re
-                fixed_prompt = re.sub(r'\((,\s*)', r'\1(', prompt)
-                fixed_prompts.append(fixed_prompt)
-            processed_text = fixed_prompts[0] if fixed_prompts else text
-        else:
-            prompts = generator.generate(text, num_images=1, seeds=seed)
-            processed_text = list(prompts)[0] if prompts else text
+        prompts = generate_prompts(text, [seed], use_attention)
+        processed_text = prompts[0] if prompts else text
         
         return (processed_text, seed)
     
@@ -404,14 +404,10 @@ class DN_pyPinNode:
     def IS_CHANGED(cls, node_configs, pinterest_data, username, unique_id):
         return random.random()
 
-@register_operation_handler
-async def handle_username_changed(request):
+@register_operation_handler('username_changed', 'board_selected', 'remove_boards_cache', 'switch_to_cached', 'get_cached_usernames', 'load_cached_data', 'get_pinterest_pins')
+async def handle_username_changed(data):
     """Handle username change messages from frontend"""
-    data = await request.json()
-
     operation = data.get('operation')
-    if operation not in ['username_changed', 'board_selected', 'remove_boards_cache', 'switch_to_cached', 'get_cached_usernames', 'load_cached_data', 'get_pinterest_pins']:
-        return None
         
     node_id = str(data.get('id', 'unknown'))
 
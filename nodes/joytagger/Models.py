@@ -1059,4 +1059,84 @@ class ViT(VisionModel):
 			state_dict['head.weight'] = state_dict['head.weight'][:self.n_tags]
 			state_dict['head.bias'] = state_dict['head.bias'][:self.n_tags]
 
-		self.load_state_dict(state_dict)
\ No newline at end of file
+		self.load_state_dict(state_dict)
+
+
+class InferenceViT(nn.Module):
+	"""
+	Eval-only forward of a ViT for torch.compile: patch dropout, stochastic depth, the
+	shape asserts and the loss branch are left out so the traced graph has no Python
+	control flow. Shares parameters with the wrapped model.
+	"""
+	def __init__(self, vit: ViT):
+		super().__init__()
+		self.vit = vit
+
+	def forward(self, image: torch.Tensor) -> torch.Tensor:
+		vit = self.vit
+		x = vit.patch_embeddings(image)
+		x = x.flatten(2).transpose(1, 2)
+		x = vit.pos_embedding(x, image.shape[3], image.shape[2])
+
+		for block in vit.blocks:
+			x = vit_block_inference(block, x)
+
+		x = vit.norm(x)
+		if vit.head_mean_after:
+			return vit.head(x).mean(dim=1)
+		return vit.head(x.mean(dim=1))
+
+
+def vit_block_inference(block: ViTBlock, x: torch.Tensor) -> torch.Tensor:
+	bsz, src_len, embed_dim = x.shape
+	head_dim = embed_dim // block.num_heads
+
+	out = block.norm1(x)
+	q_states, k_states, v_states = (
+		s.view(bsz, src_len, block.num_heads, head_dim).transpose(1, 2)
+		for s in block.qkv_proj(out).split(block.d_model, dim=-1)
+	)
+	out = F.scaled_dot_product_attention(q_states, k_states, v_states)
+	out = out.transpose(1, 2).contiguous().view(bsz, src_len, embed_dim)
+	x = block.skip_init1(block.out_proj(out)) + x
+
+	out = block.mlp.linear2(block.mlp.activation(block.mlp.linear1(block.norm2(x))))
+	return block.skip_init2(out) + x
+
+
+def _compile_with_fallback(module: nn.Module):
+	try:
+		compiled = torch.compile(module, dynamic=False)
+	except Exception as e:
+		print(f"torch.compile unavailable ({e}), using the eager inference graph")
+		return module
+
+	def run(image: torch.Tensor) -> torch.Tensor:
+		nonlocal compiled
+		try:
+			return compiled(image)
+		except Exception as e:
+			if compiled is module:
+				raise
+			# Compilation happens lazily on the first call (e.g. no triton/compiler on this platform)
+			print(f"torch.compile failed ({e}), falling back to the eager inference graph")
+			compiled = module
+			return module(image)
+
+	return run
+
+
+def compiled_inference(model: ViT, device: str, dtype: torch.dtype):
+	"""
+	Return the compiled InferenceViT for this model, device and dtype, compiling it on first use.
+	The compiled graphs are kept on the model, so they are dropped together with it.
+	"""
+	cache = getattr(model, '_compiled_inference', None)
+	if cache is None:
+		cache = {}
+		model._compiled_inference = cache
+
+	key = (str(device), dtype)
+	if key not in cache:
+		cache[key] = _compile_with_fallback(InferenceViT(model).eval())
+	return cache[key]
@@ -356,9 +356,8 @@ OPERATION_HANDLERS = {
     "oauth_callback": handle_oauth_callback
 }
 
-@register_operation_handler
-async def handle_pinterest_operations(request) -> Any:
-    json_data = await request.json()
+@register_operation_handler(*OPERATION_HANDLERS)
+async def handle_pinterest_operations(json_data) -> Any:
     node_id = json_data.get("id")
     operation = json_data.get("operation")
     payload = json_data.get("payload", {})
@@ -366,9 +365,6 @@ async def handle_pinterest_operations(request) -> Any:
     app_secret = payload.get("app_secret")
     custom_scope = payload.get("scope")
     
-    if operation not in OPERATION_HANDLERS:
-        return web.json_response({"error": "Unknown operation"}, status=400)
-    
     if operation in ["get_token_validation", "start_authentication", "oauth_callback"]:
         if operation == "oauth_callback":
             code = payload.get("code")
@@ -1,3 +1,6 @@
+import asyncio
+import json
+import threading
 import time
 import os
 from typing import Any, Dict, Optional, Callable, List
@@ -9,29 +12,241 @@ class TimedOutException(Exception):
     """Exception raised when waiting for a message times out"""
     pass
 
+class MessageCancelledException(Exception):
+    """Exception raised when a wait for a message is cancelled"""
+    pass
+
+class _MessageWaiter:
+    """
+    One pending wait for a message, woken directly by the route: a threading.Event for
+    node code on the execution thread, an asyncio.Future for coroutines
+    """
+    def __init__(self, index: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.index = index
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+        self.message = None
+        self.cancelled = False
+        # Set under ComfyAPIMessage._lock together with message: from then on the message belongs to this wait
+        self.claimed = False
+
+    def claim(self, message: Any = None, cancelled: bool = False) -> None:
+        """Hand the message over; called under ComfyAPIMessage._lock"""
+        self.message = message
+        self.cancelled = cancelled
+        self.claimed = True
+
+    def wake(self) -> None:
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(self._resolve_future)
+        else:
+            self.event.set()
+
+    def _resolve_future(self) -> None:
+        # Already done when the wait timed out meanwhile; it reads the claimed message itself
+        if not self.future.done():
+            self.future.set_result(None)
+
 class ComfyAPIMessage:
     """
-    Message collector for node communications
+    Message collector for node communications. A reply is handed straight to whoever waits
+    for its identifier; replies nobody waits for yet are kept in MESSAGE until asked for.
     """
     MESSAGE = {}
+    _waiters: Dict[str, List[_MessageWaiter]] = {}
+    _lock = threading.Lock()
 
     @classmethod
-    def poll(cls, identifier, period=0.01, timeout=3) -> Any:
-        """Poll for a message with the given identifier"""
-        start_time = time.monotonic()
+    def _take_or_wait(cls, index: str, waiter: _MessageWaiter) -> bool:
+        """Register the waiter unless the message is already here; True if it was"""
+        with cls._lock:
+            if index in cls.MESSAGE:
+                waiter.message = cls.MESSAGE.pop(index)
+                return True
+            cls._waiters.setdefault(index, []).append(waiter)
+            return False
+
+    @classmethod
+    def _release(cls, index: str, waiter: _MessageWaiter) -> bool:
+        """Stop a timed out wait from being handed a message; True if one was claimed for it already"""
+        with cls._lock:
+            if waiter.claimed:
+                return True
+            waiters = cls._waiters.get(index)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del cls._waiters[index]
+            return False
+
+    @staticmethod
+    def _result(waiter: _MessageWaiter) -> Any:
+        if waiter.cancelled:
+            raise MessageCancelledException
+        return waiter.message
+
+    @staticmethod
+    def _index(identifier) -> str:
         if isinstance(identifier, (set, list, tuple)):
-            identifier = identifier[0]
-        index = str(identifier)
-        while not (index in cls.MESSAGE) and time.monotonic() - start_time < timeout:
-            time.sleep(period)
-        if index in cls.MESSAGE:
-            message = cls.MESSAGE.pop(index)
-            return message
-        else:
+            identifier = next(iter(identifier))
+        return str(identifier)
+
+    @classmethod
+    def deliver(cls, identifier, message: Any) -> None:
+        """Hand a message to the oldest waiter for its identifier, or keep it for a later wait"""
+        index = cls._index(identifier)
+        with cls._lock:
+            waiters = cls._waiters.get(index)
+            if not waiters:
+                cls.MESSAGE[index] = message
+                return
+            waiter = waiters.pop(0)
+            if not waiters:
+                del cls._waiters[index]
+            waiter.claim(message)
+        waiter.wake()
+
+    @classmethod
+    def cancel(cls, identifier) -> None:
+        """Wake every wait for the identifier with MessageCancelledException"""
+        index = cls._index(identifier)
+        with cls._lock:
+            waiters = cls._waiters.pop(index, [])
+            for waiter in waiters:
+                waiter.claim(cancelled=True)
+        for waiter in waiters:
+            waiter.wake()
+
+    @classmethod
+    def poll(cls, identifier, period=None, timeout=3) -> Any:
+        """
+        Block until the message with the given identifier arrives. period is unused: the waiting
+        thread is woken by the route as soon as the message is posted.
+        """
+        index = cls._index(identifier)
+        waiter = _MessageWaiter(index)
+        if cls._take_or_wait(index, waiter):
+            return waiter.message
+        # A message claimed just as the wait timed out is still returned: it is set before the event
+        if not waiter.event.wait(timeout) and not cls._release(index, waiter):
             raise TimedOutException
+        return cls._result(waiter)
+
+    @classmethod
+    async def wait(cls, identifier, timeout=3) -> Any:
+        """poll for coroutines: awaits the message without blocking the event loop"""
+        index = cls._index(identifier)
+        waiter = _MessageWaiter(index, asyncio.get_running_loop())
+        if cls._take_or_wait(index, waiter):
+            return waiter.message
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            if not cls._release(index, waiter):
+                raise TimedOutException
+        except asyncio.CancelledError:
+            # The awaiting task was cancelled: keep a message claimed for it for the next wait
+            if cls._release(index, waiter) and not waiter.cancelled:
+                cls.deliver(index, waiter.message)
+            raise
+        return cls._result(waiter)
+
+COALESCE_APPEND = "append"
 
-def send_message(node_id: str, operation: str, status: str, message: str, payload: Optional[Dict[str, Any]] = None) -> None:
-    """Send a standardized message to the frontend"""
+class StatusChannel:
+    """
+    Ordered websocket delivery of node messages. Coalescing messages wait up to window seconds and
+    merge into the node's last pending message when operation and status match: COALESCE_APPEND
+    concatenates string payload fields (streamed text) and keeps the newest of the rest. Any other
+    message is sent right away: on the caller's thread when nothing is queued or being sent, otherwise
+    by the sender after everything queued before it, so each node's messages arrive in the order they were sent.
+    """
+    WINDOW = 0.05
+
+    def __init__(self, event: str = MESSAGE_ROUTE, window: float = WINDOW):
+        self.event = event
+        self.window = window
+        # [message, coalesce mode] in send order
+        self._pending: List[List[Any]] = []
+        # node id -> its last pending entry
+        self._tails: Dict[str, List[Any]] = {}
+        self._urgent = False
+        # The sender is sending a batch outside the lock
+        self._sending = False
+        self._condition = threading.Condition()
+        self._sender: Optional[threading.Thread] = None
+
+    def send(self, msg: Dict[str, Any], coalesce: Optional[str] = None) -> None:
+        node_id = str(msg.get("id"))
+        with self._condition:
+            tail = self._tails.get(node_id)
+            if (coalesce and tail is not None and tail[1] == coalesce
+                    and tail[0]["operation"] == msg["operation"] and tail[0]["status"] == msg["status"]):
+                self._merge(tail[0], msg, coalesce)
+                return
+
+            was_idle = not self._pending
+            direct = not coalesce and was_idle and not self._sending
+            if not direct:
+                self._enqueue(node_id, msg, coalesce, was_idle)
+        if direct:
+            self._deliver(msg)
+
+    def _enqueue(self, node_id: str, msg: Dict[str, Any], coalesce: Optional[str], was_idle: bool) -> None:
+        """Queue a message for the sender thread; called with the condition held"""
+        entry = [msg, coalesce]
+        self._pending.append(entry)
+        self._tails[node_id] = entry
+        if not coalesce:
+            self._urgent = True
+        if self._sender is None:
+            self._sender = threading.Thread(target=self._send_loop, name="DN_StatusChannel", daemon=True)
+            self._sender.start()
+        if was_idle or not coalesce:
+            self._condition.notify()
+
+    @staticmethod
+    def _merge(pending: Dict[str, Any], msg: Dict[str, Any], coalesce: str) -> None:
+        if coalesce == COALESCE_APPEND and isinstance(pending.get("payload"), dict) and isinstance(msg.get("payload"), dict):
+            payload = dict(msg["payload"])
+            for key, value in pending["payload"].items():
+                if isinstance(value, str) and isinstance(payload.get(key), str):
+                    payload[key] = value + payload[key]
+            msg = {**msg, "payload": payload}
+        pending.clear()
+        pending.update(msg)
+
+    def _send_loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window
+                while not self._urgent and (remaining := deadline - time.monotonic()) > 0:
+                    self._condition.wait(remaining)
+                batch, self._pending, self._tails, self._urgent = self._pending, [], {}, False
+                self._sending = True
+            for msg, _ in batch:
+                self._deliver(msg)
+            with self._condition:
+                self._sending = False
+
+    def _deliver(self, msg: Dict[str, Any]) -> None:
+        # A failed send only loses that message, as a direct send_sync call would
+        try:
+            PromptServer.instance.send_sync(self.event, msg)
+        except Exception as e:
+            print(f"Error sending {msg.get('operation')} message for node {msg.get('id')}: {e}")
+
+status_channel = StatusChannel()
+
+def send_message(node_id: str, operation: str, status: str, message: str, payload: Optional[Dict[str, Any]] = None,
+                 coalesce: Optional[str] = None) -> None:
+    """
+    Send a standardized message to the frontend. With coalesce (COALESCE_APPEND),
+    high-frequency updates of the same node, operation and status are merged before they are sent.
+    """
     msg = {
         "id": node_id,
         "operation": operation,
@@ -42,16 +257,65 @@ def send_message(node_id: str, operation: str, status: str, message: str, payloa
     if payload is not None:
         msg["payload"] = payload
         
-    print(f"Sending response to {node_id}: {operation} ({status})")
-    PromptServer.instance.send_sync(MESSAGE_ROUTE, msg)
+    status_channel.send(msg, coalesce)
+
+
+# operation -> handler, called with the parsed request body
+operation_handlers: Dict[str, Callable] = {}
 
+def register_operation_handler(*operations: str):
+    """Register a handler function for the operations it serves: @register_operation_handler('op_a', 'op_b')"""
+    def decorator(handler_func: Callable):
+        for operation in operations:
+            if operation in operation_handlers:
+                raise ValueError(f"Operation '{operation}' is already handled by {operation_handlers[operation].__name__}")
+            operation_handlers[operation] = handler_func
+        return handler_func
+    return decorator
 
-operation_handlers: List[Callable] = []
+BATCH_OPERATION = "batch"
 
-def register_operation_handler(handler_func: Callable):
-    """Register a handler function for operations"""
-    operation_handlers.append(handler_func)
-    return handler_func
+async def dispatch_operation(json_data: Dict[str, Any]) -> web.Response:
+    """Run the handler registered for the message's operation"""
+    operation = json_data["operation"]
+    handler = operation_handlers.get(operation)
+    if handler is None:
+        return web.json_response({"error": f"Unknown operation: {operation}"}, status=404)
+    response = await handler(json_data)
+    if response is not None:
+        return response
+    return web.json_response({"status": "success"})
+
+def _batch_result(response: web.Response) -> Dict[str, Any]:
+    body = response.text if response.body is not None else None
+    if body and response.content_type == "application/json":
+        body = json.loads(body)
+    return {"status": response.status, "body": body}
+
+async def dispatch_batch(messages: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Run a batch of operation messages and return one {"status", "body"} result per message, in order.
+    Messages of the same node run one after another in batch order; different nodes run concurrently.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+    by_node: Dict[str, List[int]] = {}
+    for index, message in enumerate(messages):
+        if not isinstance(message, dict) or "operation" not in message:
+            results[index] = {"status": 400, "body": {"error": "Batch entries must be operation messages"}}
+        elif message["operation"] == BATCH_OPERATION:
+            results[index] = {"status": 400, "body": {"error": "Batches cannot be nested"}}
+        else:
+            by_node.setdefault(str(message.get("id")), []).append(index)
+
+    async def run_node(indices: List[int]) -> None:
+        for index in indices:
+            try:
+                results[index] = _batch_result(await dispatch_operation(messages[index]))
+            except Exception as e:
+                results[index] = {"status": 500, "body": {"error": str(e)}}
+
+    await asyncio.gather(*(run_node(indices) for indices in by_node.values()))
+    return results
 
 def register_routes():
     """Register all routes for the extension"""
@@ -64,18 +328,25 @@ def register_routes():
     @PromptServer.instance.routes.post(MESSAGE_ROUTE)
     async def route_message_post(request) -> Any:
         """Handle incoming messages"""
-        json_data = await request.json()
+        try:
+            json_data = await request.json()
+        except ValueError:
+            return web.json_response({"error": "Invalid JSON"}, status=400)
         node_id = json_data.get("id")
         
         if node_id and "operation" not in json_data:
-            ComfyAPIMessage.MESSAGE[str(node_id)] = json_data
+            ComfyAPIMessage.deliver(node_id, json_data)
             return web.json_response(json_data)
         
+        if json_data.get("operation") == BATCH_OPERATION:
+            # {"operation": "batch", "payload": {"operations": [message, ...]}} -> {"results": [...]}
+            messages = (json_data.get("payload") or {}).get("operations")
+            if not isinstance(messages, list):
+                return web.json_response({"error": "A batch needs a list of operations"}, status=400)
+            return web.json_response({"results": await dispatch_batch(messages)})
+
         if "operation" in json_data:
-            for handler in operation_handlers:
-                response = await handler(request)
-                if response is not None:
-                    return response
+            return await dispatch_operation(json_data)
                 
         return web.json_response({"status": "success"})
     
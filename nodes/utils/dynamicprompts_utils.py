@@ -0,0 +1,127 @@
+import re
+import threading
+from collections import OrderedDict
+from random import Random
+import xxhash
+from dynamicprompts.enums import SamplingMethod
+from dynamicprompts.generators.attentiongenerator import AttentionGenerator
+from dynamicprompts.generators.promptgenerator import PromptGenerator
+from dynamicprompts.parser.parse import parse
+from dynamicprompts.sampling_context import SamplingContext
+from dynamicprompts.wildcards import WildcardManager
+
+# AttentionGenerator can wrap a keyword that follows a comma as "(, keyword:0.5)"; move the comma out
+ATTENTION_COMMA_PATTERN = re.compile(r'\((,\s*)')
+
+class TemplateCache:
+    """
+    LRU cache of parsed dynamicprompts templates keyed by a hash of the template text.
+    The text is kept next to the command so a hash collision is a miss, not a wrong template.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._commands = OrderedDict()
+
+    @staticmethod
+    def key(text):
+        return xxhash.xxh3_64(text.encode()).intdigest()
+
+    def get(self, text):
+        key = self.key(text)
+        entry = self._commands.get(key)
+        if entry is not None and entry[0] == text:
+            self._commands.move_to_end(key)
+            return entry[1]
+
+        command = parse(text)
+        self._commands[key] = (text, command)
+        self._commands.move_to_end(key)
+        while len(self._commands) > self.max_entries:
+            self._commands.popitem(last=False)
+        return command
+
+    def clear(self):
+        self._commands.clear()
+
+
+class CachedPromptGenerator(PromptGenerator):
+    """
+    RandomPromptGenerator that reuses one sampling context and parsed templates across calls.
+    For a given template and seed it returns what RandomPromptGenerator().generate(template, seeds=seed) does,
+    except for seed 0: dynamicprompts treats seeds=0 as no seed and expands at random, here 0 is a seed like
+    any other, so seed 0 always gives the same expansion.
+    """
+    def __init__(self, template_cache=None):
+        self.template_cache = template_cache or TemplateCache()
+        self._context = SamplingContext(
+            wildcard_manager=WildcardManager(),
+            default_sampling_method=SamplingMethod.RANDOM,
+            rand=Random(),
+        )
+        self._lock = threading.Lock()
+
+    def generate(self, template=None, num_images=1, *, seeds=None, **kwargs):
+        if not template:
+            return [""] * num_images
+        if isinstance(seeds, int):
+            seeds = [seeds] * num_images
+        if seeds and len(seeds) != num_images:
+            raise ValueError(f"Expected {num_images} seeds, but got {len(seeds)}")
+
+        if not seeds:
+            command = self.template_cache.get(template)
+            with self._lock:
+                return [str(result) for result in self._context.sample_prompts(command, num_images)]
+        return list(self.iter_prompts(template, seeds))
+
+    def iter_prompts(self, template, seeds):
+        """
+        Lazily yield one expansion per seed, so callers can stop early without expanding the rest
+        """
+        command = self.template_cache.get(template)
+        for seed in seeds:
+            with self._lock:
+                # A fresh generator per seed, so each expansion matches a single seeded call
+                results = iter(self._context.sample_prompts(command, 1))
+                self._context.rand.seed(seed)
+                prompt = str(next(results))
+            yield prompt
+
+    def iter_combinations(self, template, limit=None):
+        """
+        Lazily yield every combination of the template in dynamicprompts' combinatorial order,
+        at most limit of them; the cartesian product is never materialized
+        """
+        command = self.template_cache.get(template)
+        context = self._context.with_sampling_method(SamplingMethod.COMBINATORIAL)
+        for result in context.sample_prompts(command, limit):
+            yield str(result)
+
+
+prompt_generator = CachedPromptGenerator()
+attention_generator = AttentionGenerator(prompt_generator)
+
+def generate_prompts(text, seeds=None, use_attention=False):
+    """
+    Expand a wildcard template once per seed in a single call, reusing the parsed template.
+    Without seeds a single unseeded expansion is returned; use_attention adds random emphasis like AttentionGenerator.
+    """
+    seeds = list(seeds) if seeds is not None else None
+    count = len(seeds) if seeds is not None else 1
+    if count == 0:
+        return []
+
+    if use_attention:
+        prompts = attention_generator.generate(text, count, seeds=seeds)
+        return [ATTENTION_COMMA_PATTERN.sub(r'\1(', prompt) for prompt in prompts]
+    return prompt_generator.generate(text, count, seeds=seeds)
+
+def iter_prompts(text, seeds, use_attention=False):
+    """
+    Lazy generate_prompts: expansions are produced one at a time as the caller consumes them
+    """
+    if not use_attention:
+        yield from prompt_generator.iter_prompts(text, seeds)
+        return
+    for seed in seeds:
+        yield generate_prompts(text, [seed], use_attention=True)[0]
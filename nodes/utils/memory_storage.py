@@ -0,0 +1,566 @@
+"""
+@title: Memory Storage Backend
+@author: Dado
+@description: Persistent key-value store for DN_MemoryStorage, one sqlite row per context and key.
+"""
+# Every context (a root graph id or "global") shares one sqlite database in WAL mode, so a get or set
+# touches a single row instead of reading and rewriting a whole JSON file, and an interrupted write
+# leaves the previous value in place. The JSON files written by older versions are imported into the
+# database the first time their context is used and renamed to *.json.migrated. Writes from the execution thread are buffered and
+# committed together by a background writer, on a timer and at interpreter exit. Typed values (images,
+# latents, tensors) are written by the same writer as safetensors files, which get maps back lazily.
+# In memory, each context keeps its values in LRU order within entry and byte budgets, and the least
+# recently used contexts are dropped beyond MAX_CONTEXTS or MAX_TOTAL_BYTES; persistent values are
+# read back from disk when they are asked for again. Keys can expire, in memory and on disk alike.
+import atexit
+import json
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+import torch
+import xxhash
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+DATABASE_NAME = "memory_storage.sqlite3"
+TENSORS_DIR = "tensors"
+FLUSH_INTERVAL = 1.0
+SLOT_TYPES = ("IMAGE", "LATENT", "TENSOR")
+
+MAX_CONTEXTS = 32
+MAX_CONTEXT_ENTRIES = 4096
+MAX_CONTEXT_BYTES = 1 << 30
+MAX_TOTAL_BYTES = 4 << 30
+
+
+def value_size(value: Any) -> int:
+    """
+    Approximate memory held by a stored value; tensors count their data, not the Python object
+    """
+    if isinstance(value, torch.Tensor):
+        return value.element_size() * value.nelement()
+    if isinstance(value, dict):
+        return sum(value_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def is_expired(expires_at: Optional[float], now: float) -> bool:
+    return expires_at is not None and expires_at <= now
+
+
+class MemoryContext:
+    """
+    One context's in-memory values in least recently used order, kept within an entry count and a byte budget
+    """
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (value, size, expires_at)
+        self.entries: "OrderedDict[Hashable, Tuple[Any, int, Optional[float]]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, now: float) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is not None and is_expired(entry[2], now):
+            self._remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float], now: float) -> bool:
+        """
+        Store a value as the most recently used one; False if it alone exceeds the byte budget,
+        in which case the key is left without a value
+        """
+        self._remove(key)
+        size = value_size(value)
+        if size > self.max_bytes:
+            return False
+        self.entries[key] = (value, size, expires_at)
+        self.bytes += size
+        if len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            # Expired entries go first, then the least recently used ones
+            for expired_key in [k for k, entry in self.entries.items() if is_expired(entry[2], now)]:
+                self._remove(expired_key)
+                self.expirations += 1
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+        return True
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class MemoryContexts:
+    """
+    Thread-safe in-memory storage of all contexts, least recently used context dropped first
+    """
+    def __init__(self, max_contexts: int = MAX_CONTEXTS, max_entries: int = MAX_CONTEXT_ENTRIES,
+                 max_bytes: int = MAX_CONTEXT_BYTES, max_total_bytes: int = MAX_TOTAL_BYTES):
+        self.max_contexts = max_contexts
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.contexts: "OrderedDict[str, MemoryContext]" = OrderedDict()
+        self.dropped_contexts = 0
+        self._lock = threading.Lock()
+
+    def get(self, context: str, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            memory_context = self.contexts.get(context)
+            if memory_context is None:
+                return None
+            self.contexts.move_to_end(context)
+            return memory_context.get(key, time.time())
+
+    def set(self, context: str, key: Hashable, value: Any, expires_at: Optional[float] = None) -> bool:
+        with self._lock:
+            memory_context = self.contexts.get(context)
+            if memory_context is None:
+                memory_context = self.contexts[context] = MemoryContext(self.max_entries, self.max_bytes)
+            self.contexts.move_to_end(context)
+            stored = memory_context.set(key, value, expires_at, time.time())
+
+            total_bytes = sum(other.bytes for other in self.contexts.values())
+            while len(self.contexts) > 1 and (len(self.contexts) > self.max_contexts or total_bytes > self.max_total_bytes):
+                _, dropped = self.contexts.popitem(last=False)
+                total_bytes -= dropped.bytes
+                self.dropped_contexts += 1
+            return stored
+
+    def discard(self, context: str) -> None:
+        with self._lock:
+            self.contexts.pop(context, None)
+
+    def stats(self, context: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            contexts = {name: memory_context.stats() for name, memory_context in self.contexts.items()
+                        if context is None or name == context}
+            return {
+                "contexts": contexts,
+                "total_bytes": sum(memory_context.bytes for memory_context in self.contexts.values()),
+                "dropped_contexts": self.dropped_contexts,
+                "limits": {
+                    "max_contexts": self.max_contexts,
+                    "max_entries": self.max_entries,
+                    "max_bytes": self.max_bytes,
+                    "max_total_bytes": self.max_total_bytes,
+                },
+            }
+
+
+def encode_slot(slot_type: str, value: Any) -> Tuple[Dict[str, torch.Tensor], Dict[str, str]]:
+    """
+    Split a typed value into the tensors and string metadata of a safetensors file.
+    LATENT is a dict: its tensor entries are stored as tensors and the rest as JSON metadata.
+    """
+    if slot_type == "LATENT":
+        tensors = {name: item for name, item in value.items() if isinstance(item, torch.Tensor)}
+        extra = {name: item for name, item in value.items() if not isinstance(item, torch.Tensor)}
+        metadata = {"slot_type": slot_type, "extra": json.dumps(extra)}
+    else:
+        tensors = {"value": value}
+        metadata = {"slot_type": slot_type}
+    return {name: tensor.detach().cpu().contiguous() for name, tensor in tensors.items()}, metadata
+
+
+def decode_slot(slot_type: str, tensors: Dict[str, torch.Tensor], metadata: Dict[str, str]) -> Any:
+    if slot_type == "LATENT":
+        value = json.loads(metadata.get("extra", "{}"))
+        value.update(tensors)
+        return value
+    return tensors["value"]
+
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+def map_slot_tensors(file_path: str) -> Tuple[Dict[str, torch.Tensor], Dict[str, str]]:
+    """
+    Tensors of a safetensors file as views of one private memory map: nothing is read until a page
+    is touched, and writes to a tensor go to its own copy-on-write pages, never to the file
+    """
+    with open(file_path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    metadata = header.pop("__metadata__", None) or {}
+    data = torch.empty(0, dtype=torch.uint8).set_(
+        torch.UntypedStorage.from_file(file_path, shared=False, nbytes=os.path.getsize(file_path))
+    )
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        start, end = info["data_offsets"]
+        tensors[name] = data[data_start + start:data_start + end].view(SAFETENSORS_DTYPES[info["dtype"]]).reshape(info["shape"])
+    return tensors, metadata
+
+
+def load_slot_file(file_path: str) -> Tuple[str, Any]:
+    """
+    Map a stored slot back; its tensors are read from the file as they are used
+    """
+    try:
+        tensors, metadata = map_slot_tensors(file_path)
+    except (KeyError, RuntimeError):
+        # A dtype or an offset the views can't express: read the tensors in full instead
+        with safe_open(file_path, framework="pt", device="cpu") as f:
+            metadata = f.metadata() or {}
+            tensors = {name: f.get_tensor(name) for name in f.keys()}
+    slot_type = metadata.get("slot_type", "TENSOR")
+    return slot_type, decode_slot(slot_type, tensors, metadata)
+
+
+class PersistentStore:
+    """
+    Thread-safe sqlite key-value store; the connection is opened on first use.
+    Deferred writes are visible to reads right away and reach the database within flush_interval.
+    Entries can carry an expiry time (time.time() based); expired ones read as missing and are purged on flush.
+    The write buffers and the database have separate locks, so buffering a write never waits for disk I/O.
+    """
+    def __init__(self, directory: str, filename: str = DATABASE_NAME, flush_interval: float = FLUSH_INTERVAL):
+        self.directory = directory
+        self.path = os.path.join(directory, filename)
+        self.flush_interval = flush_interval
+        self._connection: Optional[sqlite3.Connection] = None
+        # Guards the buffers below and the writer thread
+        self._lock = threading.Lock()
+        # Guards the connection and the legacy imports
+        self._db_lock = threading.RLock()
+        # Held for a whole flush, so flushes run one at a time
+        self._flush_lock = threading.Lock()
+        self._imported = set()
+        # context -> key -> (value, expires_at) waiting for the writer
+        self._pending: Dict[str, Dict[str, Tuple[str, Optional[float]]]] = {}
+        # context -> key -> (slot type, value, expires_at) waiting for the writer
+        self._pending_typed: Dict[str, Dict[str, Tuple[str, Any, Optional[float]]]] = {}
+        # The buffers taken by the running flush; still read from until they are in the database
+        self._flushing: Dict[str, Dict[str, Tuple[str, Optional[float]]]] = {}
+        self._flushing_typed: Dict[str, Dict[str, Tuple[str, Any, Optional[float]]]] = {}
+        self._dirty = threading.Event()
+        self._stopping = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(self.directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # With WAL, NORMAL never corrupts the database; a power loss can only drop the last commits
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS storage ("
+                "context TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL, "
+                "PRIMARY KEY (context, key)) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS typed_storage ("
+                "context TEXT NOT NULL, key TEXT NOT NULL, slot_type TEXT NOT NULL, file TEXT NOT NULL, expires_at REAL, "
+                "PRIMARY KEY (context, key)) WITHOUT ROWID"
+            )
+            # Databases created before keys could expire have no expires_at column
+            for table in ("storage", "typed_storage"):
+                columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+                if "expires_at" not in columns:
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN expires_at REAL")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def legacy_path(self, context: str) -> str:
+        return os.path.join(self.directory, f"{context}.json")
+
+    def _import_legacy(self, connection: sqlite3.Connection, context: str) -> None:
+        if context in self._imported:
+            return
+        self._imported.add(context)
+        file_path = self.legacy_path(context)
+        if not os.path.exists(file_path):
+            return
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not import memory storage file {file_path}: {e}")
+            return
+        with connection:
+            # Values already in the database are newer than the file
+            connection.executemany(
+                "INSERT OR IGNORE INTO storage (context, key, value) VALUES (?, ?, ?)",
+                [(context, key, value) for key, value in data.items() if isinstance(value, str)],
+            )
+        # Kept next to the database, for a downgrade or a migration gone wrong
+        os.replace(file_path, f"{file_path}.migrated")
+
+    @staticmethod
+    def _buffered(buffers, context: str, key: str) -> Optional[tuple]:
+        """
+        The newest buffered write of a key, None if it has none
+        """
+        for buffer in buffers:
+            items = buffer.get(context)
+            if items and key in items:
+                return items[key]
+        return None
+
+    def get_entry(self, context: str, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        """
+        (value, expires_at) of a key, None if it is missing or expired
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._buffered((self._pending, self._flushing), context, key)
+        if entry is None:
+            with self._db_lock:
+                connection = self._connect()
+                self._import_legacy(connection, context)
+                entry = connection.execute(
+                    "SELECT value, expires_at FROM storage WHERE context = ? AND key = ?", (context, key)
+                ).fetchone()
+        if entry is None or is_expired(entry[1], now):
+            return None
+        return tuple(entry)
+
+    def get(self, context: str, key: str) -> Optional[str]:
+        entry = self.get_entry(context, key)
+        return entry[0] if entry else None
+
+    def set(self, context: str, key: str, value: str, expires_at: Optional[float] = None) -> None:
+        self.set_many(context, {key: (value, expires_at)})
+
+    def set_many(self, context: str, items: Dict[str, Tuple[str, Optional[float]]]) -> None:
+        """
+        Write several keys of a context in one transaction: all of them are stored or none is
+        """
+        with self._db_lock:
+            connection = self._connect()
+            self._import_legacy(connection, context)
+            with connection:
+                connection.executemany(
+                    "INSERT INTO storage (context, key, value, expires_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (context, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                    [(context, key, value, expires_at) for key, (value, expires_at) in items.items()],
+                )
+
+    def get_typed(self, context: str, key: str) -> Optional[Tuple[str, Any, Optional[float]]]:
+        """
+        (slot type, value, expires_at) of a typed key; a stored value is mapped from its file only now
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._buffered((self._pending_typed, self._flushing_typed), context, key)
+        if entry is not None:
+            return None if is_expired(entry[2], now) else entry
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT file, expires_at FROM typed_storage WHERE context = ? AND key = ?", (context, key)
+            ).fetchone()
+        if row is None or is_expired(row[1], now):
+            return None
+        file_path = os.path.join(self.directory, TENSORS_DIR, row[0])
+        if not os.path.exists(file_path):
+            return None
+        slot_type, value = load_slot_file(file_path)
+        return slot_type, value, row[1]
+
+    def set_typed_many(self, context: str, items: Dict[str, Tuple[str, Any, Optional[float]]]) -> None:
+        """
+        Write typed values to new files, then point their keys at them in one transaction.
+        Replaced files are removed afterwards, so a crash leaves either the old or the new value.
+        """
+        directory = os.path.join(self.directory, TENSORS_DIR)
+        os.makedirs(directory, exist_ok=True)
+        prefix = xxhash.xxh64(context.encode()).hexdigest()
+        rows = []
+        try:
+            for key, (slot_type, value, expires_at) in items.items():
+                file_name = f"{prefix}-{uuid.uuid4().hex}.safetensors"
+                rows.append((context, key, slot_type, file_name, expires_at))
+                tensors, metadata = encode_slot(slot_type, value)
+                save_file(tensors, os.path.join(directory, file_name), metadata=metadata)
+        except Exception:
+            self._remove_files(row[3] for row in rows)
+            raise
+
+        with self._db_lock:
+            connection = self._connect()
+            replaced = connection.execute(
+                f"SELECT file FROM typed_storage WHERE context = ? AND key IN ({', '.join('?' * len(items))})",
+                (context, *items.keys()),
+            ).fetchall()
+            with connection:
+                connection.executemany(
+                    "INSERT INTO typed_storage (context, key, slot_type, file, expires_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (context, key) DO UPDATE SET "
+                    "slot_type = excluded.slot_type, file = excluded.file, expires_at = excluded.expires_at",
+                    rows,
+                )
+        self._remove_files(file for file, in replaced)
+
+    def _remove_files(self, file_names) -> None:
+        for file_name in file_names:
+            try:
+                os.remove(os.path.join(self.directory, TENSORS_DIR, file_name))
+            except OSError:
+                # Still mapped by a tensor somewhere (Windows), or already gone
+                pass
+
+    def set_deferred(self, context: str, key: str, value: str, expires_at: Optional[float] = None) -> None:
+        """
+        Buffer a write for the background writer; later writes of the same key replace it
+        """
+        with self._lock:
+            self._pending.setdefault(context, {})[key] = (value, expires_at)
+            self._start_writer()
+
+    def set_typed_deferred(self, context: str, key: str, slot_type: str, value: Any, expires_at: Optional[float] = None) -> None:
+        """
+        Buffer a typed write; the value is kept by reference until the writer saves it
+        """
+        with self._lock:
+            self._pending_typed.setdefault(context, {})[key] = (slot_type, value, expires_at)
+            self._start_writer()
+
+    def _start_writer(self) -> None:
+        if self._writer is None:
+            self._stopping.clear()
+            self._writer = threading.Thread(target=self._write_loop, name="DN_MemoryStorageWriter", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+        self._dirty.set()
+
+    def _write_loop(self) -> None:
+        while True:
+            self._dirty.wait()
+            # Collect the writes arriving within the interval into one transaction
+            stopping = self._stopping.wait(self.flush_interval)
+            self.flush()
+            if stopping:
+                return
+
+    def flush(self) -> None:
+        """
+        Commit all buffered writes, one transaction per context.
+        The buffers are only swapped under the buffer lock; files and commits are written outside it.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._pending = self._pending, {}
+                self._flushing_typed, self._pending_typed = self._pending_typed, {}
+                self._dirty.clear()
+            failed, failed_typed = {}, {}
+            for context, items in self._flushing_typed.items():
+                try:
+                    self.set_typed_many(context, items)
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Error writing typed memory storage for {context}: {e}")
+                    failed_typed[context] = items
+                except Exception as e:
+                    # Not a storage failure (e.g. a latent entry JSON can't hold): retrying would not help
+                    print(f"Could not persist typed memory storage for {context}, skipped: {e}")
+            for context, items in self._flushing.items():
+                try:
+                    self.set_many(context, items)
+                except sqlite3.Error as e:
+                    print(f"Error writing memory storage for {context}: {e}")
+                    failed[context] = items
+            with self._lock:
+                self._flushing, self._flushing_typed = {}, {}
+                # Keep the failed writes unless newer ones arrived meanwhile
+                for buffer, failed_items in ((self._pending, failed), (self._pending_typed, failed_typed)):
+                    for context, items in failed_items.items():
+                        for key, value in items.items():
+                            buffer.setdefault(context, {}).setdefault(key, value)
+                if failed or failed_typed:
+                    self._dirty.set()
+            try:
+                self.purge_expired()
+            except sqlite3.Error as e:
+                print(f"Error purging expired memory storage: {e}")
+
+    def purge_expired(self) -> None:
+        """
+        Delete expired keys and the files of expired typed keys
+        """
+        now = time.time()
+        with self._db_lock:
+            connection = self._connect()
+            files = connection.execute("SELECT file FROM typed_storage WHERE expires_at <= ?", (now,)).fetchall()
+            with connection:
+                connection.execute("DELETE FROM storage WHERE expires_at <= ?", (now,))
+                connection.execute("DELETE FROM typed_storage WHERE expires_at <= ?", (now,))
+        self._remove_files(file for file, in files)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending_writes = sum(len(items) for buffer in (self._pending, self._pending_typed, self._flushing, self._flushing_typed)
+                                 for items in buffer.values())
+        with self._db_lock:
+            connection = self._connect()
+            return {
+                "pending_writes": pending_writes,
+                "stored_keys": connection.execute("SELECT COUNT(*) FROM storage").fetchone()[0],
+                "stored_typed_keys": connection.execute("SELECT COUNT(*) FROM typed_storage").fetchone()[0],
+            }
+
+    def delete_context(self, context: str) -> None:
+        # Waiting for a running flush keeps it from writing the context back after the delete
+        with self._flush_lock, self._db_lock:
+            with self._lock:
+                self._pending.pop(context, None)
+                self._pending_typed.pop(context, None)
+            connection = self._connect()
+            files = connection.execute("SELECT file FROM typed_storage WHERE context = ?", (context,)).fetchall()
+            with connection:
+                connection.execute("DELETE FROM storage WHERE context = ?", (context,))
+                connection.execute("DELETE FROM typed_storage WHERE context = ?", (context,))
+            self._remove_files(file for file, in files)
+            self._imported.add(context)
+            file_path = self.legacy_path(context)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def close(self) -> None:
+        writer = self._writer
+        if writer is not None:
+            self._stopping.set()
+            self._dirty.set()
+            writer.join()
+            self._writer = None
+        self.flush()
+        with self._db_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,146 @@
+import json
+import pickle
+from collections import OrderedDict
+from pathlib import Path
+import torch
+import xxhash
+
+ACCURACY_FIXTURE_COUNT = 8
+ACCURACY_FIXTURE_SEED = 0
+
+def quantize_dynamic_int8(model):
+    """Swap the Linear layers of a model for dynamically int8-quantized ones (CPU inference only)"""
+    model = model.cpu().eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def quantized_cache_path(weights_file):
+    """Cache file next to the fp32 weights, named after their size and mtime so updated weights are re-converted"""
+    weights_file = Path(weights_file)
+    stat = weights_file.stat()
+    return weights_file.with_name(f"{weights_file.stem}.int8-{stat.st_size}-{int(stat.st_mtime)}.pt")
+
+def tag_agreement(reference_scores, quantized_scores, threshold):
+    """Compare fp32 and quantized sigmoid scores of one image: tag-set overlap at threshold and max score drift"""
+    reference_tags = reference_scores >= threshold
+    quantized_tags = quantized_scores >= threshold
+    union = (reference_tags | quantized_tags).sum().item()
+    intersection = (reference_tags & quantized_tags).sum().item()
+    return {
+        "reference_tags": int(reference_tags.sum().item()),
+        "quantized_tags": int(quantized_tags.sum().item()),
+        "jaccard": intersection / union if union else 1.0,
+        "max_abs_diff": float((reference_scores.float() - quantized_scores.float()).abs().max().item()),
+    }
+
+def accuracy_fixture_images(size=448, count=ACCURACY_FIXTURE_COUNT, seed=ACCURACY_FIXTURE_SEED):
+    """
+    The fixed fp32 vs int8 fixture set: seeded two-color gradients overlaid with coarse and fine noise,
+    in the IMAGE layout (H, W, C floats in [0, 1]). The same arguments always give the same images.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    ys, xs = torch.meshgrid(torch.linspace(0, 1, size), torch.linspace(0, 1, size), indexing="ij")
+    images = []
+    for _ in range(count):
+        colors = torch.rand(2, 3, generator=generator)
+        angle = torch.rand(1, generator=generator).item() * 2 * torch.pi
+        gradient = ((xs * torch.cos(torch.tensor(angle)) + ys * torch.sin(torch.tensor(angle))) / 2 + 0.5).clamp(0, 1)
+        image = colors[0] * (1 - gradient[..., None]) + colors[1] * gradient[..., None]
+        coarse = torch.nn.functional.interpolate(torch.rand(1, 3, 8, 8, generator=generator), size=(size, size), mode="bilinear", align_corners=False)
+        image = 0.6 * image + 0.3 * coarse[0].permute(1, 2, 0) + 0.1 * torch.rand(size, size, 3, generator=generator)
+        images.append(image.clamp(0, 1))
+    return torch.stack(images)
+
+def check_quantized_accuracy(fp32_model, quantized_model, score_fn, fixtures, threshold):
+    """Run both models over a fixture set and summarize how closely the int8 tags follow the fp32 tags"""
+    per_image = []
+    with torch.no_grad():
+        for fixture in fixtures:
+            reference = score_fn(fp32_model, fixture).flatten()
+            quantized = score_fn(quantized_model, fixture).flatten()
+            per_image.append(tag_agreement(reference, quantized, threshold))
+
+    if not per_image:
+        return None
+    return {
+        "threshold": threshold,
+        "fixtures": len(per_image),
+        "mean_jaccard": sum(r["jaccard"] for r in per_image) / len(per_image),
+        "min_jaccard": min(r["jaccard"] for r in per_image),
+        "max_abs_diff": max(r["max_abs_diff"] for r in per_image),
+        "per_image": per_image,
+    }
+
+def load_quantized_model(name, weights_file, build_skeleton, load_fp32, score_fn=None, make_fixtures=None, threshold=0.4):
+    """
+    Return an int8 dynamically quantized CPU copy of a tagger model.
+
+    The first call loads the fp32 model via load_fp32, quantizes it and stores the quantized
+    state dict on disk; if make_fixtures is given, fp32 and int8 tags are compared on the model inputs
+    it returns (made from accuracy_fixture_images) and the report is written next to the cache. It is
+    only called on conversion, so cached loads don't build the fixtures. Later calls
+    quantize an untrained skeleton from build_skeleton and load the cached int8 weights into it,
+    skipping the fp32 checkpoint entirely. The cache is loaded with weights_only, so a tampered
+    file can't run code; one that doesn't load that way is converted again.
+    """
+    cache_path = quantized_cache_path(weights_file)
+
+    if cache_path.exists():
+        print(f"Loading cached int8 {name} model from {cache_path}")
+        model = quantize_dynamic_int8(build_skeleton())
+        try:
+            model.load_state_dict(torch.load(cache_path, map_location="cpu", weights_only=True))
+            return model.eval()
+        except (pickle.UnpicklingError, RuntimeError) as e:
+            print(f"Cached int8 {name} model could not be loaded ({e}), converting again")
+
+    print(f"Quantizing {name} model to int8, the result is cached at {cache_path}")
+    fp32_model = load_fp32().cpu().eval()
+    model = quantize_dynamic_int8(fp32_model)
+    torch.save(model.state_dict(), cache_path)
+
+    fixtures = make_fixtures() if score_fn is not None and make_fixtures is not None else None
+    if fixtures:
+        report = check_quantized_accuracy(fp32_model, model, score_fn, fixtures, threshold)
+        with open(cache_path.with_suffix(".json"), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"{name} int8 accuracy vs fp32 over {report['fixtures']} fixture(s): "
+              f"mean tag jaccard {report['mean_jaccard']:.3f}, min {report['min_jaccard']:.3f}, "
+              f"max score drift {report['max_abs_diff']:.4f}")
+
+    del fp32_model
+    return model.eval()
+
+
+class ScoreCache:
+    """
+    LRU cache of raw sigmoid score vectors keyed by a hash of the input pixels plus a model id.
+    Scores are stored as float16 on the CPU, so re-tagging an image with different thresholds,
+    tag counts or exclusions only redoes the post-processing.
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._scores = OrderedDict()
+
+    @staticmethod
+    def key(image, model_id):
+        pixels = image.detach().cpu().contiguous()
+        digest = xxhash.xxh3_64(pixels.view(torch.uint8).numpy()).hexdigest()
+        return (model_id, tuple(pixels.shape), str(pixels.dtype), digest)
+
+    def get(self, key):
+        scores = self._scores.get(key)
+        if scores is None:
+            return None
+        self._scores.move_to_end(key)
+        return scores.float()
+
+    def put(self, key, scores):
+        self._scores[key] = scores.detach().to("cpu", torch.float16)
+        self._scores.move_to_end(key)
+        while len(self._scores) > self.max_entries:
+            self._scores.popitem(last=False)
+
+    def clear(self):
+        self._scores.clear()
+
+score_cache = ScoreCache()
@@ -0,0 +1,254 @@
+"""
+@title: TagOps Program
+@author: Dado
+@description: Compiles TagOps operation strings once and applies them to tag lists in a single pass.
+"""
+# Rules run in order and each sees the output of the previous one, but every rule only ever rewrites
+# one tag at a time: "!" rules map each tag independently and first-occurrence rules fire on the first
+# matching tag that reaches them. So instead of one list scan per rule, each tag is pushed through the
+# rule chain on its own, jumping straight to the next rule that matches it, and the output comes out
+# in the same order the rule-by-rule scans produced.
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+OPERATORS = {':': 'replace', '<': 'prepend', '>': 'append'}
+
+
+def normalize_tag(tag: str) -> str:
+    return tag.replace(' ', '_')
+
+
+def split_outside_brackets(s: str, delimiter: str = ',') -> List[str]:
+    parts = []
+    balance = 0
+    last_idx = 0
+    for i, char in enumerate(s):
+        if char in '({':
+            balance += 1
+        elif char in ')}':
+            balance -= 1
+        elif char == delimiter and balance == 0:
+            parts.append(s[last_idx:i].strip())
+            last_idx = i + 1
+    parts.append(s[last_idx:].strip())
+    return [p for p in parts if p]
+
+
+def find_main_operator_and_split(rule: str):
+    # Iterate from right to left to find the rightmost operator outside brackets
+    balance = 0
+    for i in range(len(rule) - 1, -1, -1):
+        char = rule[i]
+        if char in ')}':
+            balance += 1
+        elif char in '({':
+            balance -= 1
+        elif char in OPERATORS and balance == 0:
+            op = OPERATORS[char]
+            all_occur = i+1 < len(rule) and rule[i+1] == '!'
+            partial = i > 0 and rule[i-1] == '?'
+            left = rule[:i-1 if partial else i].strip()
+            right = rule[i+1 + (1 if all_occur else 0):].strip()
+            return op, all_occur, partial, left, right
+    return None, None, None, None, None  # No valid operator found
+
+
+class TagRule:
+    """
+    One compiled rule: operation, normalized left options and the tags it inserts
+    """
+    __slots__ = ("text", "op", "all_occur", "partial", "options", "rights", "right_norms")
+
+    def __init__(self, text: str, op: str, all_occur: bool, partial: bool, options: List[str], rights: List[str]):
+        self.text = text
+        self.op = op
+        self.all_occur = all_occur
+        self.partial = partial
+        self.options = tuple(options)
+        self.rights = tuple(rights)
+        self.right_norms = tuple(normalize_tag(right) for right in rights)
+
+    def matches(self, normalized_tag: str) -> bool:
+        if self.partial:
+            return any(normalized_core in normalized_tag for normalized_core in self.options)
+        return normalized_tag in self.options
+
+
+def parse_rule(rule: str) -> Optional[TagRule]:
+    op, all_occur, partial, left, right = find_main_operator_and_split(rule)
+    if op is None:
+        return None
+    left_options = [normalize_tag(part.strip()) for part in left.split('|') if part.strip()]
+    rights = split_outside_brackets(right)
+    if rights == ['DELETE']:
+        if op != 'replace':
+            raise ValueError("delete op (DELETE) is only valid for replace (:) operations")
+        op = 'delete'
+        rights = []
+    elif any(r.strip() == 'DELETE' for r in rights):
+        raise ValueError("delete op (DELETE) must be alone")
+    return TagRule(rule, op, all_occur, partial, left_options, rights)
+
+
+class PatternAutomaton:
+    """
+    Aho-Corasick automaton over many substrings, each labelled with the rules it belongs to.
+    search() walks a text once and returns the labels of every pattern occurring in it,
+    however many patterns there are.
+    """
+    def __init__(self, labelled_patterns: Dict[str, Set[int]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        own: List[Set[int]] = [set()]
+
+        for pattern, labels in labelled_patterns.items():
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    own.append(set())
+                state = next_state
+            own[state] |= labels
+
+        # Breadth-first, so a state's failure target is finished before the state itself
+        self.output: List[FrozenSet[int]] = [frozenset()] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        for state in queue:
+            self.output[state] = frozenset(own[state])
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.output[next_state] = frozenset(own[next_state]) | self.output[self.fail[next_state]]
+                queue.append(next_state)
+
+    def search(self, text: str) -> Set[int]:
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+class TagProgram:
+    """
+    A compiled operations string. Exact-match rules are indexed by normalized tag and the options of
+    partial ("?") rules share one automaton; the sorted rule positions matching a normalized tag are
+    computed once per distinct tag and reused across runs.
+    """
+    MAX_CACHED_TAGS = 65536
+
+    def __init__(self, rules: List[TagRule]):
+        self.rules = rules
+        self.exact_index: Dict[str, List[int]] = {}
+        for position, rule in enumerate(rules):
+            if not rule.partial:
+                for option in set(rule.options):
+                    self.exact_index.setdefault(option, []).append(position)
+        self.partial_rules = [position for position, rule in enumerate(rules) if rule.partial]
+        partial_options: Dict[str, Set[int]] = {}
+        for position in self.partial_rules:
+            for option in rules[position].options:
+                partial_options.setdefault(option, set()).add(position)
+        self.partial_automaton = PatternAutomaton(partial_options) if partial_options else None
+        self._matching: Dict[str, Tuple[int, ...]] = {}
+
+    def matching_rules(self, normalized_tag: str) -> Tuple[int, ...]:
+        """Positions of all rules whose left side matches the tag, ascending"""
+        matching = self._matching.get(normalized_tag)
+        if matching is None:
+            positions = self.exact_index.get(normalized_tag, [])
+            partial = self.partial_automaton.search(normalized_tag) if self.partial_automaton else None
+            matching = tuple(sorted(partial.union(positions))) if partial else tuple(positions)
+            if len(self._matching) >= self.MAX_CACHED_TAGS:
+                self._matching.clear()
+            self._matching[normalized_tag] = matching
+        return matching
+
+    def run(self, tag_list: List[str], stats: Optional[List[int]] = None) -> List[str]:
+        """
+        Apply all rules to a tag list. If stats is given, stats[i] is increased by the number of tags rule i rewrote.
+        """
+        rules = self.rules
+        spent = [False] * len(rules)
+        output = []
+        # (tag, normalized tag, first rule it still has to go through), next tag to process on top
+        pending = [(tag, normalize_tag(tag), 0) for tag in reversed(tag_list)]
+
+        while pending:
+            tag, normalized_tag, start = pending.pop()
+            matching = self.matching_rules(normalized_tag)
+            position = None
+            for candidate in matching[bisect_left(matching, start):]:
+                if not spent[candidate]:
+                    position = candidate
+                    break
+            if position is None:
+                output.append(tag)
+                continue
+
+            rule = rules[position]
+            if not rule.all_occur:
+                spent[position] = True
+            if stats is not None:
+                stats[position] += 1
+
+            following = position + 1
+            rights = [(right, right_norm, following) for right, right_norm in zip(rule.rights, rule.right_norms)]
+            if rule.op == 'replace':
+                produced = rights
+            elif rule.op == 'prepend':
+                produced = rights + [(tag, normalized_tag, following)]
+            elif rule.op == 'append':
+                produced = [(tag, normalized_tag, following)] + rights
+            else:
+                produced = []
+            pending.extend(reversed(produced))
+
+        return output
+
+
+@lru_cache(maxsize=32)
+def compile_operations(operations: str) -> TagProgram:
+    """
+    Compile an operations string (";"-separated rules) once; the program is cached on the string's hash
+    """
+    rules = []
+    for rule in operations.split(';'):
+        rule = rule.strip()
+        if not rule:
+            continue
+        parsed = parse_rule(rule)
+        if parsed:
+            rules.append(parsed)
+    return TagProgram(rules)
+
+
+def split_tags(tags: str) -> List[str]:
+    return [tag.strip() for tag in tags.split(', ') if tag.strip()]
+
+
+def run_batch(operations: str, tag_strings: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    Apply one operations string to many comma-separated tag strings, returning the processed strings
+    in input order and, per rule, the number of tags it rewrote over the whole batch.
+    All strings share the compiled program and its per-tag match cache.
+    """
+    program = compile_operations(operations)
+    stats = [0] * len(program.rules)
+    return [', '.join(program.run(split_tags(tags), stats)) for tags in tag_strings], stats
@@ -0,0 +1,113 @@
+"""
+@title: Wildcard Combinations
+@author: Dado
+@description: Exact combination counts and index-addressed combinations of wildcard prompts, without enumeration.
+"""
+# Combinations follow the selector's view of a prompt (the tree WildcardStructureCreation builds from
+# wildcard_ast): each wildcard picks one of its choices, choices are told apart by position, not text,
+# and a choice with nested wildcards contributes all of their combinations. Indices are mixed-radix
+# numbers over the wildcards in source order, the last one varying fastest like dynamicprompts'
+# combinatorial sampler.
+import random
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, List
+from . import wildcard_ast
+
+
+class CombinationSpace:
+    """
+    Combination counts of every wildcard of a prompt, computed once bottom-up.
+    count is exact (Python ints do not overflow) and combination(k) costs one step per chosen wildcard.
+    """
+    def __init__(self, text: str):
+        self.parsed = wildcard_ast.parse_cached(text)
+        # id(wildcard) -> cumulative combination counts of its choices
+        self._cumulative: Dict[int, List[int]] = {}
+        self.count = self._sequence_count(self.parsed.wildcards)
+
+    def _sequence_count(self, wildcards: List[wildcard_ast.Wildcard]) -> int:
+        total = 1
+        for wildcard in wildcards:
+            total *= self._wildcard_count(wildcard)
+        return total
+
+    def _wildcard_count(self, wildcard: wildcard_ast.Wildcard) -> int:
+        cumulative = []
+        running = 0
+        for choice in wildcard.choices:
+            running += self._sequence_count(choice.wildcards)
+            cumulative.append(running)
+        self._cumulative[id(wildcard)] = cumulative
+        # "{}" has no choices and always expands to nothing
+        return running or 1
+
+    def combination(self, index: int) -> str:
+        """
+        The index-th combination, 0 <= index < count
+        """
+        if not 0 <= index < self.count:
+            raise IndexError(f"Combination index {index} out of range for {self.count} combinations")
+        source = self.parsed.text
+        return self._render(source, 0, len(source), self.parsed.wildcards, index)
+
+    def _render(self, source: str, start: int, end: int, wildcards: List[wildcard_ast.Wildcard], index: int) -> str:
+        digits = []
+        for wildcard in reversed(wildcards):
+            cumulative = self._cumulative[id(wildcard)]
+            index, digit = divmod(index, cumulative[-1] if cumulative else 1)
+            digits.append(digit)
+
+        pieces = []
+        position = start
+        for wildcard, digit in zip(wildcards, reversed(digits)):
+            pieces.append(source[position:wildcard.start])
+            cumulative = self._cumulative[id(wildcard)]
+            if cumulative:
+                choice_index = bisect_right(cumulative, digit)
+                choice = wildcard.choices[choice_index]
+                offset = digit - (cumulative[choice_index - 1] if choice_index else 0)
+                pieces.append(self._render(source, choice.start, choice.end, choice.wildcards, offset))
+            position = wildcard.end
+        pieces.append(source[position:end])
+        return "".join(pieces)
+
+    def sample(self, count: int, seed: int = 0) -> List[int]:
+        """
+        count distinct, stratified indices: the index range is cut into count equal strata and one index
+        is drawn uniformly from each, in increasing order. All indices when count covers the whole space.
+        """
+        if count >= self.count:
+            return list(range(self.count))
+        rng = random.Random(seed)
+        return [
+            (stratum * self.count) // count + rng.randrange(((stratum + 1) * self.count) // count - (stratum * self.count) // count)
+            for stratum in range(count)
+        ]
+
+
+@lru_cache(maxsize=32)
+def combination_space(text: str) -> CombinationSpace:
+    return CombinationSpace(text)
+
+
+def count_combinations(text: str) -> int:
+    """
+    Exact number of combinations of a wildcard prompt
+    """
+    return combination_space(text).count
+
+
+def combination_at(text: str, index: int) -> str:
+    """
+    The index-th combination of a wildcard prompt, without enumerating the ones before it
+    """
+    return combination_space(text).combination(index)
+
+
+def sample_combinations(text: str, count: int, seed: int = 0) -> List[str]:
+    """
+    count distinct combinations spread evenly over the whole combination space
+    """
+    space = combination_space(text)
+    return [space.combination(index) for index in space.sample(count, seed)]
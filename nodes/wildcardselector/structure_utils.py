@@ -7,12 +7,17 @@
 import xxhash
 import json
 from typing import Dict, Any, List, Tuple
+from . import wildcard_ast
 
 class WildcardStructureCreation:
     def __init__(self):
         self.position_cache = {}
         self.unique_id_counter = {}
         self.MAX_NESTING_DEPTH = 21
+        self.full_text = ""
+        self.sections = []
+        self._node_log = []
+        self._key_log = []
     
     def generate_unique_id(self, content: str, context_path: str = "", occurrence: int = 0) -> str:
         """
@@ -29,67 +34,19 @@ class WildcardStructureCreation:
         """
         Find wildcard boundaries with position tracking
         """
-        wildcards = []
-        bracket_depth = 0
-        start_pos = None
-        
-        for i, char in enumerate(text):
-            if char == '{':
-                if bracket_depth == 0:
-                    start_pos = i
-                bracket_depth += 1
-            elif char == '}':
-                bracket_depth -= 1
-                if bracket_depth == 0 and start_pos is not None:
-                    wildcards.append((start_pos, i + 1))
-                    start_pos = None
-        return wildcards
+        return [(wildcard.start, wildcard.end) for wildcard in wildcard_ast.parse_cached(text).wildcards]
     
     def parse_choices(self, wildcard_content: str) -> List[str]:
         """
         Parse choices within wildcard, handling nested structures
         """
-        choices = []
-        current_choice = ""
-        bracket_depth = 0
-        
-        for char in wildcard_content:
-            if char == '{':
-                bracket_depth += 1
-            elif char == '}':
-                bracket_depth -= 1
-            elif char == '|' and bracket_depth == 0:
-                choices.append(current_choice.strip())
-                current_choice = ""
-                continue
-            current_choice += char
-        
-        if current_choice.strip():
-            choices.append(current_choice.strip())
-        return choices
+        return wildcard_ast.split_top_level(wildcard_content, '|')
     
     def parse_sections(self, prompt: str) -> List[str]:
         """
         Split prompt into comma-separated sections, respecting bracket depth
         """
-        sections = []
-        current_section = ""
-        bracket_depth = 0
-        
-        for char in prompt:
-            if char == '{':
-                bracket_depth += 1
-            elif char == '}':
-                bracket_depth -= 1
-            elif char == ',' and bracket_depth == 0:
-                sections.append(current_section.strip())
-                current_section = ""
-                continue
-            current_section += char
-        
-        if current_section.strip():
-            sections.append(current_section.strip())
-        return sections
+        return wildcard_ast.split_top_level(prompt, ',')
     
     def create_json_structure(self, text: str, parent_path: str = "", depth: int = 0) -> Dict[str, Any]:
         """
@@ -100,94 +57,175 @@ class WildcardStructureCreation:
             "root_nodes": [] if depth == 0 else None
         }
         
+        parsed = wildcard_ast.parse_cached(text)
+        
         if depth == 0:
             self.unique_id_counter = {}
             self.full_text = text
-        
-        if depth == 0:
-            sections = self.parse_sections(text)
-            
-            current_pos = 0
-            
-            for i, section in enumerate(sections):
-                section_start = text.find(section, current_pos)
-                section_end = section_start + len(section)
-                current_pos = section_end
-                
-                section_id = self.generate_unique_id(section, parent_path, i)
-                
-                content_key = section
-                if content_key not in self.unique_id_counter:
-                    self.unique_id_counter[content_key] = 0
-                else:
-                    self.unique_id_counter[content_key] += 1
-                    section_id = self.generate_unique_id(section, parent_path, self.unique_id_counter[content_key])
-                
-                section_path = f"{parent_path}/{section_id}" if parent_path else section_id
-                
-                structure["nodes"][section_id] = {
-                    "type": "section",
-                    "content": section,
-                    "path": section_path,
-                    "position": {"start": section_start, "end": section_end},
-                    "children": {}
-                }
-                
-                structure["root_nodes"].append(section_id)
-                
-                section_wildcards = self.find_wildcards(section)
-                for wc_idx, (wc_start, wc_end) in enumerate(section_wildcards):
-                    wildcard_content = section[wc_start:wc_end]
-                    absolute_start = section_start + wc_start
-                    absolute_end = section_start + wc_end
-                    wildcard_id = self._process_wildcard(
-                        structure, wildcard_content, section_path,
-                        absolute_start, absolute_end, depth + 1, wc_idx
-                    )
-                    structure["nodes"][section_id]["children"][wildcard_id] = True
+            self.sections = []
+            for i, section_node in enumerate(parsed.choices):
+                self._build_section(structure, text, section_node, i, parent_path)
         else:
-            wildcards = self.find_wildcards(text)
-            for wc_idx, (wc_start, wc_end) in enumerate(wildcards):
-                wildcard_content = text[wc_start:wc_end]
-                self._process_wildcard(
-                    structure, wildcard_content, parent_path,
-                    wc_start, wc_end, depth + 1, wc_idx
-                )
+            for wildcard in parsed.wildcards:
+                self._process_wildcard(structure, text, wildcard, parent_path, depth + 1)
         
         return structure
     
-    def _process_wildcard(self, structure: Dict[str, Any], wildcard_content: str, parent_path: str, start_pos: int, end_pos: int, depth: int, occurrence: int):
+    def _next_occurrence(self, content_key: str) -> int:
         """
-        Process a single wildcard and add it to the structure
+        Count one more occurrence of content_key and return its 0-based occurrence number
         """
-        content_key = wildcard_content
         if content_key not in self.unique_id_counter:
             self.unique_id_counter[content_key] = 0
         else:
             self.unique_id_counter[content_key] += 1
+        occurrence = self.unique_id_counter[content_key]
+        self._key_log.append((content_key, occurrence))
+        return occurrence
+    
+    def _build_section(self, structure: Dict[str, Any], source: str, section_node: wildcard_ast.Segment, index: int, parent_path: str = "") -> Dict[str, Any]:
+        """
+        Add one top-level section and its wildcards to the structure, and record what an incremental
+        update needs to reuse it later: the (ID, node) pairs it created and the occurrence numbers its IDs depend on
+        """
+        self._node_log = []
+        self._key_log = []
+        section = section_node.text(source)
+        
+        occurrence = self._next_occurrence(section)
+        section_id = self.generate_unique_id(section, parent_path, occurrence if occurrence else index)
+        section_path = f"{parent_path}/{section_id}" if parent_path else section_id
+        
+        section_dict = {
+            "type": "section",
+            "content": section,
+            "path": section_path,
+            "position": {"start": section_node.start, "end": section_node.end},
+            "children": {}
+        }
+        structure["nodes"][section_id] = section_dict
+        structure["root_nodes"].append(section_id)
+        self._node_log.append((section_id, section_dict))
+        
+        for wildcard in section_node.wildcards:
+            wildcard_id = self._process_wildcard(structure, source, wildcard, section_path, 1)
+            section_dict["children"][wildcard_id] = True
+        
+        first_seen = {}
+        key_counts = {}
+        for key, seen in self._key_log:
+            first_seen.setdefault(key, seen)
+            key_counts[key] = key_counts.get(key, 0) + 1
+        
+        entry = {
+            "content": section,
+            "id": section_id,
+            "start": section_node.start,
+            "nodes": self._node_log,
+            "first_seen": first_seen,
+            "key_counts": key_counts,
+        }
+        self.sections.append(entry)
+        return entry
+    
+    def _reuse_section(self, entry: Dict[str, Any]) -> bool:
+        """
+        A previously built section keeps its IDs only if every content key it numbers would get the
+        same occurrence numbers again; if so, advance the counters as rebuilding it would
+        """
+        counter = self.unique_id_counter
+        for key, seen in entry["first_seen"].items():
+            if (counter[key] + 1 if key in counter else 0) != seen:
+                return False
+        for key, count in entry["key_counts"].items():
+            counter[key] = entry["first_seen"][key] + count - 1
+        return True
+    
+    def snapshot(self, structure: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        State of the last top-level build, the previous argument of update_json_structure
+        """
+        return {"text": self.full_text, "structure": structure, "sections": self.sections}
+    
+    def update_json_structure(self, text: str, previous: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Build the structure of an edited prompt from the snapshot of the previous one.
+        Sections with the same index, text and ID numbering are reused as they were (positions shifted),
+        only the others are analysed again. Returns the new structure and the structural diff to
+        previous: removed node IDs, rebuilt nodes, [offset, node IDs] position shifts and the root nodes.
+        """
+        old_nodes = previous["structure"]["nodes"]
+        old_sections = previous["sections"]
+        structure = {"nodes": {}, "root_nodes": []}
+        rebuilt = []
+        shifted = []
+        
+        parsed = wildcard_ast.parse_cached(text)
+        self.unique_id_counter = {}
+        self.full_text = text
+        self.sections = []
+        
+        for i, section_node in enumerate(parsed.choices):
+            old = old_sections[i] if i < len(old_sections) else None
+            if (old is not None
+                    and old["content"] == section_node.text(text)
+                    and self._reuse_section(old)):
+                delta = section_node.start - old["start"]
+                moved = []
+                reused = []
+                for node_id, node in old["nodes"]:
+                    if old_nodes.get(node_id) is not node:
+                        # Its ID collided with a later node last time, so the client holds that one
+                        rebuilt.append(node_id)
+                    elif delta and "position" in node:
+                        moved.append(node_id)
+                    if delta and "position" in node:
+                        position = node["position"]
+                        node = dict(node, position={"start": position["start"] + delta, "end": position["end"] + delta})
+                    structure["nodes"][node_id] = node
+                    reused.append((node_id, node))
+                if moved:
+                    shifted.append([delta, moved])
+                structure["root_nodes"].append(old["id"])
+                self.sections.append(dict(old, start=section_node.start, nodes=reused))
+            else:
+                entry = self._build_section(structure, text, section_node, i)
+                rebuilt.extend(node_id for node_id, _ in entry["nodes"])
+        
+        diff = {
+            "removed": [node_id for node_id in old_nodes if node_id not in structure["nodes"]],
+            "upserted": {node_id: structure["nodes"][node_id] for node_id in rebuilt},
+            "shifted": shifted,
+            "root_nodes": structure["root_nodes"],
+        }
+        return structure, diff
+    
+    def _process_wildcard(self, structure: Dict[str, Any], source: str, wildcard: wildcard_ast.Wildcard, parent_path: str, depth: int):
+        """
+        Process a single wildcard and add it to the structure.
+        Positions are the absolute spans the parser recorded, so nested wildcards need no position recovery.
+        """
+        wildcard_content = wildcard.text(source)
         
         wildcard_id = self.generate_unique_id(
-            wildcard_content, parent_path, self.unique_id_counter[content_key]
+            wildcard_content, parent_path, self._next_occurrence(wildcard_content)
         )
         
         wildcard_path = f"{parent_path}/{wildcard_id}"
         
-        inner_content = wildcard_content[1:-1]  # Remove { and }
-        choices = self.parse_choices(inner_content)
-        
         wildcard_node = {
             "type": "wildcard",
             "content": wildcard_content,
             "path": wildcard_path,
-            "position": {"start": start_pos, "end": end_pos},
+            "position": {"start": wildcard.start, "end": wildcard.end},
             "options": [],
             "selection": None
         }
         
-        for choice_idx, choice in enumerate(choices):
-            nested_wildcards = self.find_wildcards(choice)
+        for choice_idx, choice_node in enumerate(wildcard.choices):
+            choice = choice_node.text(source)
             
-            if nested_wildcards:
+            if choice_node.wildcards:
                 choice_id = self.generate_unique_id(choice, wildcard_path, choice_idx)
                 choice_path = f"{wildcard_path}/{choice_id}"
                 
@@ -196,7 +234,7 @@ class WildcardStructureCreation:
                     "path": choice_path
                 })
                 
-                choice_node = {
+                nested_choice = {
                     "type": "choice",
                     "content": choice,
                     "path": choice_path,
@@ -204,62 +242,17 @@ class WildcardStructureCreation:
                     "children": {}
                 }
                 
-                structure["nodes"][choice_id] = choice_node
+                structure["nodes"][choice_id] = nested_choice
+                self._node_log.append((choice_id, nested_choice))
                 
-                for nw_idx, (nw_start, nw_end) in enumerate(nested_wildcards):
-                    nested_content = choice[nw_start:nw_end]
-                    
-                    if hasattr(self, 'full_text'):
-                        parent_inner_content = wildcard_content[1:-1]
-                        parent_choices = self.parse_choices(parent_inner_content)
-                        
-                        choice_offset = 1
-                        for i in range(choice_idx):
-                            choice_offset += len(parent_choices[i]) + 1
-                        parent_wildcard_pos = self.full_text.find(wildcard_content, start_pos)
-                        if parent_wildcard_pos != -1:
-                            absolute_start = parent_wildcard_pos + choice_offset + nw_start
-                            absolute_end = parent_wildcard_pos + choice_offset + nw_end
-                            
-                            if (absolute_start >= 0 and absolute_end <= len(self.full_text) and
-                                    self.full_text[absolute_start:absolute_end] == nested_content):
-                                pass
-                            else:
-                                occurrence_count = 0
-                                for i in range(choice_idx):
-                                    if nested_content in parent_choices[i]:
-                                        occurrence_count += 1
-                                
-                                search_pos = parent_wildcard_pos
-                                for _ in range(occurrence_count + 1):
-                                    found_pos = self.full_text.find(nested_content, search_pos)
-                                    if found_pos != -1:
-                                        absolute_start = found_pos
-                                        absolute_end = found_pos + len(nested_content)
-                                        search_pos = found_pos + 1
-                                    else:
-                                        break
-                        else:
-                            absolute_start = start_pos + choice_offset + nw_start
-                            absolute_end = start_pos + choice_offset + nw_end
-                    else:
-                        parent_inner_content = wildcard_content[1:-1]
-                        parent_choices = self.parse_choices(parent_inner_content)
-                        choice_offset = 1
-                        for i in range(choice_idx):
-                            choice_offset += len(parent_choices[i]) + 1
-                        absolute_start = start_pos + choice_offset + nw_start
-                        absolute_end = start_pos + choice_offset + nw_end
-                    
-                    nested_id = self._process_wildcard(
-                        structure, nested_content, choice_path,
-                        absolute_start, absolute_end, depth + 1, nw_idx
-                    )
-                    choice_node["children"][nested_id] = True
+                for nested in choice_node.wildcards:
+                    nested_id = self._process_wildcard(structure, source, nested, choice_path, depth + 1)
+                    nested_choice["children"][nested_id] = True
             else:
                 wildcard_node["options"].append(choice)
         
         structure["nodes"][wildcard_id] = wildcard_node
+        self._node_log.append((wildcard_id, wildcard_node))
         
         return wildcard_id
     
@@ -268,7 +261,129 @@ class WildcardStructureCreation:
         """
         Convert structure to JSON string for frontend consumption
         """
-        return json.dumps(structure, indent=2)
+        return json.dumps(structure, separators=(',', ':'))
+    
+    # Compact wire format: the prompt is sent once and nodes are records that reference it by span,
+    # with paths, children and parent_wildcard rebuilt from parent links by expand_nodes:
+    #   ["s", id, start, end]                                  section
+    #   ["w", id, parent_id, start, end, options, selection]   wildcard, options are [start, end] or a choice id
+    #   ["c", id, parent_wildcard_id, start, end]              choice with nested wildcards
+    #   ["x", id, node]                                        any node that does not expand back exactly
+    
+    @staticmethod
+    def compact_structure(structure: Dict[str, Any], text: str) -> Dict[str, Any]:
+        """
+        Compact wire form of a structure built from text
+        """
+        return {
+            "t": text,
+            "r": structure.get("root_nodes") or [],
+            "n": WildcardStructureCreation.compact_nodes(structure.get("nodes", {}), text),
+        }
+    
+    @staticmethod
+    def compact_nodes(nodes: Dict[str, Dict[str, Any]], text: str) -> List[list]:
+        """
+        Encode a node map as compact records. The encoding is checked by expanding it, and nodes that
+        do not come back identical (e.g. the losers of an ID collision) are sent as they are.
+        """
+        wildcards_by_start = {}
+        pending = [wildcard for section in wildcard_ast.parse_cached(text).sections for wildcard in section.wildcards]
+        while pending:
+            wildcard = pending.pop()
+            wildcards_by_start[wildcard.start] = wildcard
+            pending.extend(child for option in wildcard.options for child in option.wildcards)
+        
+        records = {}
+        choice_spans = {}
+        for node_id, node in nodes.items():
+            if node.get("type") == "wildcard":
+                records[node_id] = _compact_wildcard(node_id, node, wildcards_by_start, choice_spans)
+        for node_id, node in nodes.items():
+            node_type = node.get("type")
+            position = node.get("position")
+            if node_type == "section" and position:
+                records[node_id] = ["s", node_id, position["start"], position["end"]]
+            elif node_type == "choice" and node_id in choice_spans:
+                records[node_id] = ["c", node_id, node.get("parent_wildcard"), *choice_spans[node_id]]
+        
+        raw = {node_id for node_id in nodes if records.get(node_id) is None}
+        # A pass that finds mismatches sends at least one more node raw, so len(nodes) + 1 passes always suffice
+        for _ in range(len(nodes) + 1):
+            encoded = [["x", node_id, node] if node_id in raw else records[node_id] for node_id, node in nodes.items()]
+            expanded = WildcardStructureCreation.expand_nodes(encoded, text)
+            mismatched = {
+                node_id for node_id, node in nodes.items()
+                if node_id not in raw and not _same_node(expanded.get(node_id), node)
+            }
+            if not mismatched:
+                return encoded
+            raw |= mismatched
+        return [["x", node_id, node] for node_id, node in nodes.items()]
+    
+    @staticmethod
+    def expand_nodes(records: List[list], text: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Inverse of compact_nodes, mirrored by the frontend's expandCompactNodes
+        """
+        by_id = {record[1]: record for record in records}
+        children = {}
+        for record in records:
+            if record[0] == "w":
+                children.setdefault(record[2], {})[record[1]] = True
+        
+        paths = {}
+        def path_of(node_id):
+            if node_id not in paths:
+                record = by_id.get(node_id)
+                if record is None:
+                    paths[node_id] = None
+                elif record[0] == "s":
+                    paths[node_id] = node_id
+                elif record[0] == "x":
+                    paths[node_id] = record[2].get("path")
+                else:
+                    parent_path = path_of(record[2])
+                    paths[node_id] = f"{parent_path}/{node_id}" if parent_path is not None else None
+            return paths[node_id]
+        
+        nodes = {}
+        for record in records:
+            kind, node_id = record[0], record[1]
+            if kind == "s":
+                _, _, start, end = record
+                nodes[node_id] = {
+                    "type": "section",
+                    "content": text[start:end],
+                    "path": path_of(node_id),
+                    "position": {"start": start, "end": end},
+                    "children": children.get(node_id, {})
+                }
+            elif kind == "w":
+                _, _, _, start, end, options, selection = record
+                nodes[node_id] = {
+                    "type": "wildcard",
+                    "content": text[start:end],
+                    "path": path_of(node_id),
+                    "position": {"start": start, "end": end},
+                    "options": [
+                        text[option[0]:option[1]] if isinstance(option, list) else {"id": option, "path": path_of(option)}
+                        for option in options
+                    ],
+                    "selection": selection
+                }
+            elif kind == "c":
+                _, _, parent_wildcard, start, end = record
+                nodes[node_id] = {
+                    "type": "choice",
+                    "content": text[start:end],
+                    "path": path_of(node_id),
+                    "parent_wildcard": parent_wildcard,
+                    "children": children.get(node_id, {})
+                }
+            else:
+                nodes[node_id] = record[2]
+        return nodes
     
     @staticmethod
     def merge_selected(old, new):
@@ -292,3 +407,31 @@ class WildcardStructureCreation:
                         if isinstance(old_v, dict) and 'selected' in old_v:
                             v['selected'] = old_v.get('selected', v['selected'])
                     WildcardStructureCreation.merge_selected(old.get(k, {}), v)
+
+
+def _compact_wildcard(node_id: str, node: Dict[str, Any], wildcards_by_start: Dict[int, wildcard_ast.Wildcard], choice_spans: Dict[str, Tuple[int, int]]):
+    position = node.get("position")
+    path = node.get("path", "")
+    if not position or "/" not in path:
+        return None
+    wildcard = wildcards_by_start.get(position["start"])
+    if wildcard is None or wildcard.end != position["end"] or len(wildcard.choices) != len(node.get("options", ())):
+        return None
+    
+    options = []
+    for option, choice_node in zip(node["options"], wildcard.choices):
+        if isinstance(option, dict):
+            options.append(option["id"])
+            choice_spans[option["id"]] = (choice_node.start, choice_node.end)
+        else:
+            options.append([choice_node.start, choice_node.end])
+    
+    parent_id = path.rsplit("/", 1)[0].rsplit("/", 1)[-1]
+    return ["w", node_id, parent_id, position["start"], position["end"], options, node.get("selection")]
+
+
+def _same_node(expanded: Dict[str, Any], node: Dict[str, Any]) -> bool:
+    return (
+        expanded == node
+        and list(expanded.get("children", ())) == list(node.get("children", ()))
+    )
@@ -0,0 +1,179 @@
+"""
+@title: Wildcard AST
+@author: Dado
+@description: Linear-time tokenizer and parser for wildcard prompts, producing a compact AST with source spans.
+"""
+# Syntax handled here: "{a|b|c}" wildcards (nestable inside options), "|" separating options
+# inside a wildcard and "," separating top-level sections. "|" outside a wildcard and ","
+# inside one are plain text, as is a stray "}". An unclosed "{" turns the rest of the prompt
+# into plain text, matching the brace counting the consumers did before.
+import re
+from functools import lru_cache
+from typing import Iterator, List, Tuple
+
+_TOKEN_PATTERN = re.compile(r"[{}|,]")
+
+
+def tokenize(text: str) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (position, char) for every structural character; plain text is skipped in C by the regex
+    """
+    for match in _TOKEN_PATTERN.finditer(text):
+        yield match.start(), match.group()
+
+
+def _stripped_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+class Segment:
+    """
+    A top-level comma section or one option of a wildcard: its whitespace-stripped
+    span in the source and the wildcards directly inside it
+    """
+    __slots__ = ("start", "end", "wildcards")
+
+    def __init__(self, start: int, end: int, wildcards: List["Wildcard"]):
+        self.start = start
+        self.end = end
+        self.wildcards = wildcards
+
+    def text(self, source: str) -> str:
+        return source[self.start:self.end]
+
+
+class Wildcard:
+    """
+    A "{...}" wildcard: span including both braces and its options in source order
+    """
+    __slots__ = ("start", "end", "options")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.end = -1
+        self.options: List[Segment] = []
+
+    def text(self, source: str) -> str:
+        return source[self.start:self.end]
+
+    def inner_text(self, source: str) -> str:
+        return source[self.start + 1:self.end - 1]
+
+    @property
+    def choices(self) -> List[Segment]:
+        """Options with a trailing empty option dropped, e.g. "{a|b|}" has two choices"""
+        if self.options and self.options[-1].start == self.options[-1].end:
+            return self.options[:-1]
+        return self.options
+
+    def innermost(self) -> Iterator["Wildcard"]:
+        """Descendant-or-self wildcards without nested wildcards and with non-empty content, in source order"""
+        nested = False
+        for option in self.options:
+            for child in option.wildcards:
+                nested = True
+                yield from child.innermost()
+        if not nested and self.end - self.start > 2:
+            yield self
+
+
+class ParsedPrompt:
+    """
+    Parse result of a whole prompt: comma sections and all top-level wildcards, spans absolute
+    """
+    __slots__ = ("text", "sections", "wildcards")
+
+    def __init__(self, text: str, sections: List[Segment]):
+        self.text = text
+        self.sections = sections
+        self.wildcards = [wildcard for section in sections for wildcard in section.wildcards]
+
+    @property
+    def choices(self) -> List[Segment]:
+        """Sections with a trailing empty section dropped, e.g. "a, b," has two sections"""
+        if self.sections and self.sections[-1].start == self.sections[-1].end:
+            return self.sections[:-1]
+        return self.sections
+
+
+def parse(text: str) -> ParsedPrompt:
+    """
+    Parse a prompt in one pass over its structural characters
+    """
+    sections: List[Segment] = []
+    section_start = 0
+    section_wildcards: List[Wildcard] = []
+    # Open wildcards, each with the start and nested wildcards of the option being read
+    stack: List[Tuple[Wildcard, int, List[Wildcard]]] = []
+
+    for pos, char in tokenize(text):
+        if char == '{':
+            stack.append((Wildcard(pos), pos + 1, []))
+        elif not stack:
+            if char == ',':
+                start, end = _stripped_span(text, section_start, pos)
+                sections.append(Segment(start, end, section_wildcards))
+                section_start = pos + 1
+                section_wildcards = []
+        elif char == '|':
+            wildcard, option_start, option_wildcards = stack[-1]
+            start, end = _stripped_span(text, option_start, pos)
+            wildcard.options.append(Segment(start, end, option_wildcards))
+            stack[-1] = (wildcard, pos + 1, [])
+        elif char == '}':
+            wildcard, option_start, option_wildcards = stack.pop()
+            start, end = _stripped_span(text, option_start, pos)
+            wildcard.options.append(Segment(start, end, option_wildcards))
+            wildcard.end = pos + 1
+            (stack[-1][2] if stack else section_wildcards).append(wildcard)
+
+    # Whatever is still open was never closed and stays plain text
+    start, end = _stripped_span(text, section_start, len(text))
+    sections.append(Segment(start, end, section_wildcards))
+    return ParsedPrompt(text, sections)
+
+
+@lru_cache(maxsize=64)
+def parse_cached(text: str) -> ParsedPrompt:
+    """
+    parse() memoized on the prompt text, for consumers that look at the same prompt repeatedly.
+    The returned tree is shared and must not be modified.
+    """
+    return parse(text)
+
+
+def split_top_level(text: str, separator: str) -> List[str]:
+    """
+    Split text on separator outside of braces, stripping parts and dropping a trailing empty part
+    """
+    parts = []
+    depth = 0
+    part_start = 0
+    for pos, char in tokenize(text):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[part_start:pos].strip())
+            part_start = pos + 1
+    last = text[part_start:].strip()
+    if last:
+        parts.append(last)
+    return parts
+
+
+def has_top_level(text: str, separator: str) -> bool:
+    depth = 0
+    for _, char in tokenize(text):
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        elif char == separator and depth == 0:
+            return True
+    return False
@@ -0,0 +1,56 @@
+"""
+Per-image latency of the JoyTagger ViT: eager forward vs the compiled inference graph.
+
+Usage: python joytag_compile_benchmark.py <joytag model dir> [--device cpu|cuda] [--runs 20]
+"""
+import argparse
+import importlib.util
+import time
+from pathlib import Path
+import torch
+
+MODELS_PY = Path(__file__).resolve().parents[2] / "nodes" / "joytagger" / "Models.py"
+
+def load_models_module():
+    spec = importlib.util.spec_from_file_location("joytagger_models", MODELS_PY)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def time_per_image(fn, image, runs, device):
+    with torch.no_grad():
+        fn(image)  # warmup, includes compilation for the compiled path
+        if device == "cuda":
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn(image)
+        if device == "cuda":
+            torch.cuda.synchronize()
+    return (time.perf_counter() - start) / runs * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model_dir")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    Models = load_models_module()
+    model = Models.VisionModel.load_model(Path(args.model_dir), device=args.device).eval()
+    image = torch.randn(1, 3, model.image_size, model.image_size, device=args.device)
+
+    with torch.no_grad(), torch.amp.autocast_mode.autocast(args.device, enabled=True):
+        dtype = torch.get_autocast_dtype(args.device)
+        compiled = Models.compiled_inference(model, args.device, dtype)
+        eager_ms = time_per_image(lambda x: model({'image': x})['tags'], image, args.runs, args.device)
+        compiled_ms = time_per_image(compiled, image, args.runs, args.device)
+        max_diff = (model({'image': image})['tags'] - compiled(image)).abs().max().item()
+
+    print(f"device={args.device} runs={args.runs}")
+    print(f"eager:    {eager_ms:8.2f} ms/image")
+    print(f"compiled: {compiled_ms:8.2f} ms/image ({eager_ms / compiled_ms:.2f}x)")
+    print(f"max logit difference: {max_diff:.5f}")
+
+if __name__ == "__main__":
+    main()
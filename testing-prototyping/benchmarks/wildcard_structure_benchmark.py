@@ -0,0 +1,66 @@
+"""
+Scaling of WildcardStructureCreation.create_json_structure with nesting depth and prompt size,
+and the size of the indented vs compact payload (the compact one is checked to round-trip).
+
+Usage: python wildcard_structure_benchmark.py [--sections 200] [--runs 5]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "nodes"))
+
+from wildcardselector.structure_utils import WildcardStructureCreation  # noqa: E402
+
+
+def nested_wildcard(depth, tag):
+    """{a|b|{a|b|{...}}} nested depth levels deep, with spaces around options"""
+    wildcard = f"{{ {tag}0 | {tag}1 }}"
+    for level in range(1, depth):
+        wildcard = f"{{ {tag}{level}a | {tag}{level}b | {wildcard} }}"
+    return wildcard
+
+
+def build_prompt(sections, depth):
+    return ", ".join(f"section {i} {nested_wildcard(depth, f't{i}_')}" for i in range(sections))
+
+
+def time_structure(prompt, runs):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        structure = WildcardStructureCreation().create_json_structure(prompt)
+        best = min(best, time.perf_counter() - start)
+    return structure, best * 1000
+
+
+def payload_sizes(structure, prompt):
+    indented = json.dumps(structure, indent=2)
+    compact = json.dumps(WildcardStructureCreation.compact_structure(structure, prompt), separators=(',', ':'))
+    decoded = json.loads(compact)
+    assert WildcardStructureCreation.expand_nodes(decoded["n"], decoded["t"]) == structure["nodes"]
+    assert decoded["r"] == structure["root_nodes"]
+    return len(indented) / 1024, len(compact) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    max_depth = WildcardStructureCreation().MAX_NESTING_DEPTH
+    print(f"{'depth':>5} {'prompt KB':>10} {'wildcards':>10} {'ms':>9} {'us/wildcard':>12} {'indent KB':>10} {'compact KB':>11}")
+    for depth in range(1, max_depth + 1, 2):
+        prompt = build_prompt(args.sections, depth)
+        structure, elapsed = time_structure(prompt, args.runs)
+        indented_kb, compact_kb = payload_sizes(structure, prompt)
+        wildcards = args.sections * depth
+        print(f"{depth:>5} {len(prompt) / 1024:>10.1f} {wildcards:>10} {elapsed:>9.2f} {elapsed * 1000 / wildcards:>12.2f} "
+              f"{indented_kb:>10.1f} {compact_kb:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Modules that do not import the extension package (wildcardselector, utils.tagops, ...) are
+# imported directly from the nodes directory, the same way the benchmarks do
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "nodes"))
@@ -0,0 +1,90 @@
+"""
+The compact wire form of a selector structure expands back to the same nodes, in Python and in the
+frontend's expandCompactNodes (WildcardsMediator.js, run with node when it is installed).
+"""
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from wildcardselector.structure_utils import WildcardStructureCreation
+
+MEDIATOR_JS = Path(__file__).resolve().parents[1] / "web" / "common" / "js" / "DN_WildcardSelectorComposerV2" / "WildcardsMediator.js"
+
+PROMPTS = [
+    "",
+    "no wildcards at all",
+    "a {red|green|blue} ball",
+    "first {a|b}, second {c|d|}, third {|e}",
+    "nested {x|{y|{z|w}}} deep, sibling {p|q}",
+    # identical wildcards, told apart by occurrence
+    "{cat|dog}, {cat|dog}, {{cat|dog}|dog}",
+    "{ spaced | options } and {multi word option|other one}",
+    "café {crème|brûlée}, naïve {ü|ö}",
+    # outside the BMP: spans count code points, JavaScript strings count UTF-16 units
+    "😀 {a|🐱} c, {𝒳|{y|😀}}",
+    "line one {a|b}\nline two {c|{d|e}}\n\nline four",
+    ", ".join(f"section {i} {{ t{i}a | t{i}b | {{ t{i}c | t{i}d }} }}" for i in range(20)),
+]
+
+
+def compact(prompt):
+    structure = WildcardStructureCreation().create_json_structure(prompt)
+    return structure, json.loads(json.dumps(WildcardStructureCreation.compact_structure(structure, prompt)))
+
+
+def assert_same_nodes(expanded, nodes):
+    assert expanded == nodes
+    assert list(expanded) == list(nodes)
+    for node_id, node in nodes.items():
+        assert list(expanded[node_id].get("children", ())) == list(node.get("children", ()))
+
+
+@pytest.mark.parametrize("prompt", PROMPTS)
+def test_compact_structure_round_trip(prompt):
+    structure, payload = compact(prompt)
+    assert payload["t"] == prompt
+    assert payload["r"] == (structure.get("root_nodes") or [])
+    assert_same_nodes(WildcardStructureCreation.expand_nodes(payload["n"], payload["t"]), structure.get("nodes", {}))
+
+
+def test_compact_nodes_falls_back_to_raw_nodes():
+    prompt = "a {b|c} d"
+    structure = WildcardStructureCreation().create_json_structure(prompt)
+    # Spans that no longer match the text can't be expanded; such nodes must be sent as they are
+    records = WildcardStructureCreation.compact_nodes(structure["nodes"], "x" * len(prompt))
+    assert_same_nodes(WildcardStructureCreation.expand_nodes(records, "x" * len(prompt)), structure["nodes"])
+    assert all(record[0] == "x" for record in records)
+
+
+def test_compact_nodes_stops_when_nothing_expands_back(monkeypatch):
+    from wildcardselector import structure_utils
+    monkeypatch.setattr(structure_utils, "_same_node", lambda expanded, node: False)
+    structure = WildcardStructureCreation().create_json_structure("a {b|{c|d}} e")
+    records = WildcardStructureCreation.compact_nodes(structure["nodes"], "a {b|{c|d}} e")
+    assert [record[0] for record in records] == ["x"] * len(structure["nodes"])
+
+
+def expand_compact_nodes_source():
+    source = MEDIATOR_JS.read_text(encoding="utf-8")
+    start = source.index("function expandCompactNodes(")
+    end = source.index("\n}\n", start) + 2
+    return source[start:end]
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_frontend_expand_matches_python():
+    payloads = [compact(prompt)[1] for prompt in PROMPTS]
+    script = expand_compact_nodes_source() + """
+let input = "";
+process.stdin.on("data", chunk => input += chunk);
+process.stdin.on("end", () => {
+    const payloads = JSON.parse(input);
+    process.stdout.write(JSON.stringify(payloads.map(payload => expandCompactNodes(payload.n, payload.t))));
+});
+"""
+    result = subprocess.run(["node", "-e", script], input=json.dumps(payloads), capture_output=True, text=True, encoding="utf-8", check=True)
+    for payload, expanded in zip(payloads, json.loads(result.stdout)):
+        assert expanded == WildcardStructureCreation.expand_nodes(payload["n"], payload["t"])
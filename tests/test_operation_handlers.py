@@ -0,0 +1,122 @@
+"""
+Every operation name on the message route belongs to exactly one handler, and every operation the
+frontend sends has one. A collision makes register_operation_handler raise while the pack is imported.
+"""
+import ast
+import importlib.util
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+NODES_DIR = REPO_DIR / "nodes"
+
+FRONTEND_DIRS = (REPO_DIR / "web" / "comfyui", REPO_DIR / "web" / "common")
+FRONTEND_CALL = re.compile(
+    r"fetchSend(?:Batched)?\(\s*(?:this\.constants\.)?MESSAGE_ROUTE\s*,\s*[^,]+,\s*[\"'](\w+)[\"']"
+)
+
+
+def handler_modules():
+    return sorted(path for path in NODES_DIR.rglob("*.py") if "register_operation_handler(" in path.read_text(encoding="utf-8"))
+
+
+def module_constants(tree):
+    constants = {}
+    for statement in tree.body:
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1 and isinstance(statement.targets[0], ast.Name):
+            value = statement.value
+            try:
+                # Only the keys of a dict matter: *OPERATION_HANDLERS unpacks its operation names
+                constants[statement.targets[0].id] = [ast.literal_eval(key) for key in value.keys] if isinstance(value, ast.Dict) else ast.literal_eval(value)
+            except ValueError:
+                pass
+    return constants
+
+
+def registered_operations(path):
+    """(operation, handler name) for each @register_operation_handler(...) in a module"""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    constants = module_constants(tree)
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decorator in node.decorator_list:
+            if not (isinstance(decorator, ast.Call) and getattr(decorator.func, "id", None) == "register_operation_handler"):
+                continue
+            for arg in decorator.args:
+                if isinstance(arg, ast.Starred):
+                    yield from ((operation, node.name) for operation in constants[arg.value.id])
+                else:
+                    yield ast.literal_eval(arg), node.name
+
+
+def all_registered_operations():
+    handlers = defaultdict(list)
+    for path in handler_modules():
+        for operation, handler in registered_operations(path):
+            handlers[operation].append(f"{path.relative_to(REPO_DIR)}:{handler}")
+    return handlers
+
+
+def test_handler_modules_found():
+    assert handler_modules(), "no module registers an operation handler"
+
+
+def test_operation_names_are_unique():
+    duplicates = {operation: owners for operation, owners in all_registered_operations().items() if len(owners) > 1}
+    assert not duplicates, f"operations registered by more than one handler: {duplicates}"
+
+
+def test_frontend_operations_are_registered():
+    registered = all_registered_operations()
+    sent = set()
+    for directory in FRONTEND_DIRS:
+        for path in directory.rglob("*.js"):
+            if path.name.startswith("inactive_"):
+                continue
+            sent.update(FRONTEND_CALL.findall(path.read_text(encoding="utf-8")))
+    assert sent, "no frontend operation calls found"
+    assert sent - {"batch"} <= set(registered), f"operations without a handler: {sorted(sent - {'batch'} - set(registered))}"
+
+
+def test_register_operation_handler_rejects_duplicates():
+    pytest.importorskip("server")
+    pytest.importorskip("folder_paths")
+    api_routes = import_extension_module("nodes.utils.api_routes")
+
+    @api_routes.register_operation_handler("__test_duplicate_operation")
+    async def first(data):
+        return None
+
+    try:
+        with pytest.raises(ValueError):
+            @api_routes.register_operation_handler("__test_duplicate_operation")
+            async def second(data):
+                return None
+    finally:
+        api_routes.operation_handlers.pop("__test_duplicate_operation", None)
+
+
+def test_every_handler_module_imports():
+    """Needs a ComfyUI environment (server, folder_paths) and the node packs' requirements"""
+    pytest.importorskip("server")
+    pytest.importorskip("folder_paths")
+    for path in handler_modules():
+        module = ".".join(path.relative_to(REPO_DIR).with_suffix("").parts)
+        import_extension_module(module)
+    api_routes = import_extension_module("nodes.utils.api_routes")
+    assert set(all_registered_operations()) <= set(api_routes.operation_handlers)
+
+
+def import_extension_module(module):
+    """Import a module of the extension package, loading the package itself first as ComfyUI does"""
+    package = REPO_DIR.name
+    if package not in sys.modules:
+        spec = importlib.util.spec_from_file_location(package, REPO_DIR / "__init__.py", submodule_search_locations=[str(REPO_DIR)])
+        sys.modules[package] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules[package])
+    return importlib.import_module(f"{package}.{module}")
@@ -0,0 +1,122 @@
+"""
+int8 dynamic quantization of the taggers, checked against fp32 on the fixed accuracy fixture set.
+The JoyTagger check needs its weights: set DN_JOYTAG_MODEL_DIR to a folder with config.json and the model.
+"""
+import json
+import os
+from pathlib import Path
+
+import pytest
+import torch
+
+from utils import tagger_utils
+from utils.tagger_utils import accuracy_fixture_images, check_quantized_accuracy, load_quantized_model, quantize_dynamic_int8
+
+MIN_MEAN_JACCARD = 0.9
+CLIP_MEAN = [0.48145466, 0.4578275, 0.40821073]
+CLIP_STD = [0.26862954, 0.26130258, 0.27577711]
+
+
+class TinyTagger(torch.nn.Module):
+    """A small fixed-seed stand-in with the tagger shape: image -> pooled features -> Linear layers -> sigmoid scores"""
+    def __init__(self, n_tags=64):
+        super().__init__()
+        self.pool = torch.nn.AdaptiveAvgPool2d(8)
+        self.head = torch.nn.Sequential(torch.nn.Linear(3 * 8 * 8, 256), torch.nn.GELU(), torch.nn.Linear(256, n_tags))
+
+    def forward(self, image):
+        return self.head(self.pool(image).flatten(1))
+
+
+def build_tiny_tagger():
+    torch.manual_seed(0)
+    return TinyTagger().eval()
+
+
+def tiny_scores(model, image):
+    return model(image).sigmoid()
+
+
+def tiny_fixtures():
+    return [image.permute(2, 0, 1).unsqueeze(0) for image in accuracy_fixture_images(64)]
+
+
+def test_accuracy_fixtures_are_reproducible():
+    images = accuracy_fixture_images(32)
+    assert images.shape == (tagger_utils.ACCURACY_FIXTURE_COUNT, 32, 32, 3)
+    assert 0 <= images.min() and images.max() <= 1
+    assert torch.equal(images, accuracy_fixture_images(32))
+    assert not torch.equal(images, accuracy_fixture_images(32, seed=1))
+
+
+def test_quantized_tags_follow_fp32_on_fixtures(tmp_path):
+    weights_file = tmp_path / "tiny.pt"
+    torch.save(build_tiny_tagger().state_dict(), weights_file)
+
+    model = load_quantized_model("tiny", weights_file, build_tiny_tagger, build_tiny_tagger,
+                                 score_fn=tiny_scores, make_fixtures=tiny_fixtures, threshold=0.5)
+
+    cache_path = tagger_utils.quantized_cache_path(weights_file)
+    report = json.loads(cache_path.with_suffix(".json").read_text(encoding="utf-8"))
+    assert report["fixtures"] == tagger_utils.ACCURACY_FIXTURE_COUNT
+    assert report["mean_jaccard"] >= MIN_MEAN_JACCARD
+    assert report["max_abs_diff"] < 0.05
+    # The same fixtures give the same report
+    assert report == json.loads(json.dumps(check_quantized_accuracy(build_tiny_tagger(), model, tiny_scores, tiny_fixtures(), 0.5)))
+
+
+def test_cached_model_loads_weights_only(tmp_path, monkeypatch):
+    weights_file = tmp_path / "tiny.pt"
+    torch.save(build_tiny_tagger().state_dict(), weights_file)
+    converted = load_quantized_model("tiny", weights_file, build_tiny_tagger, build_tiny_tagger)
+
+    load_calls = []
+    original_load = torch.load
+    def recording_load(*args, **kwargs):
+        load_calls.append(kwargs)
+        return original_load(*args, **kwargs)
+    monkeypatch.setattr(torch, "load", recording_load)
+
+    def no_fp32():
+        raise AssertionError("the fp32 model must not be loaded when the cache is valid")
+    def no_fixtures():
+        raise AssertionError("the fixtures must not be built when the cache is valid")
+    cached = load_quantized_model("tiny", weights_file, build_tiny_tagger, no_fp32, score_fn=tiny_scores, make_fixtures=no_fixtures)
+
+    assert [call.get("weights_only") for call in load_calls] == [True]
+    fixture = tiny_fixtures()[0]
+    with torch.no_grad():
+        assert torch.equal(converted(fixture), cached(fixture))
+
+
+def test_unloadable_cache_is_converted_again(tmp_path):
+    weights_file = tmp_path / "tiny.pt"
+    torch.save(build_tiny_tagger().state_dict(), weights_file)
+    cache_path = tagger_utils.quantized_cache_path(weights_file)
+    # Not loadable with weights_only: an arbitrary pickled object
+    torch.save({"payload": TinyTagger}, cache_path)
+
+    model = load_quantized_model("tiny", weights_file, build_tiny_tagger, build_tiny_tagger)
+
+    reference = quantize_dynamic_int8(build_tiny_tagger())
+    fixture = tiny_fixtures()[0]
+    with torch.no_grad():
+        assert torch.equal(model(fixture), reference(fixture))
+    assert torch.load(cache_path, weights_only=True).keys() == reference.state_dict().keys()
+
+
+@pytest.mark.skipif(not os.environ.get("DN_JOYTAG_MODEL_DIR"), reason="DN_JOYTAG_MODEL_DIR is not set")
+def test_joytag_int8_tags_follow_fp32_on_fixtures():
+    pytest.importorskip("transformers")
+    pytest.importorskip("einops")
+    from joytagger import Models
+
+    model_dir = Path(os.environ["DN_JOYTAG_MODEL_DIR"])
+    fp32_model = Models.VisionModel.load_model(model_dir, device="cpu").eval()
+    image_size = json.loads((model_dir / "config.json").read_text(encoding="utf-8"))["image_size"]
+    mean, std = torch.tensor(CLIP_MEAN)[:, None, None], torch.tensor(CLIP_STD)[:, None, None]
+    fixtures = [((image.permute(2, 0, 1) - mean) / std).unsqueeze(0) for image in accuracy_fixture_images(image_size)]
+
+    report = check_quantized_accuracy(fp32_model, quantize_dynamic_int8(fp32_model), lambda model, image: model({"image": image})["tags"].sigmoid(), fixtures, 0.4)
+
+    assert report["mean_jaccard"] >= MIN_MEAN_JACCARD
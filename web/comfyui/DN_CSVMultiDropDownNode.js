@@ -1,12 +1,12 @@
 import { app } from "../../scripts/app.js"
 
-let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend;
+let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend, fetchSendBatched;
 (async () => {
   const constants = await fetch('/dadosConstants').then(response => response.json());
   EXTENSION_NAME = constants.EXTENSION_NAME;
   MESSAGE_ROUTE = constants.MESSAGE_ROUTE;
   
-  ({chainCallback, fetchSend} = 
+  ({chainCallback, fetchSend, fetchSendBatched} = 
    await import(`/extensions/${EXTENSION_NAME}/common/js/utils.js`));
 })().catch(error => console.error("Failed to load utilities:", error));
 
@@ -74,7 +74,7 @@ app.registerExtension({
                         payload[id + "_entries"] = widget.options.values.filter(v => v !== "random");
                     }
                 }
-                await fetchSend(MESSAGE_ROUTE, this.id, "update_selections", payload);
+                await fetchSendBatched(MESSAGE_ROUTE, this.id, "update_selections", payload);
             };
 
             this.resetDropdowns = function() {
@@ -173,7 +173,7 @@ app.registerExtension({
         const originalOnNodeRemoved = app.graph.onNodeRemoved;
         app.graph.onNodeRemoved = function(node) {
             if (node.type === "DN_CSVMultiDropDownNode") {
-                fetchSend(MESSAGE_ROUTE, node.id, "remove_selection");
+                fetchSendBatched(MESSAGE_ROUTE, node.id, "remove_csv_selection");
             }
             originalOnNodeRemoved?.apply(this, arguments);
         };
@@ -1,13 +1,13 @@
 import { app } from "../../scripts/app.js";
 import { addValueControlWidget } from "../../scripts/widgets.js";
 
-let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend;
+let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend, fetchSendBatched;
 (async () => {
   const constants = await fetch('/dadosConstants').then(response => response.json());
   EXTENSION_NAME = constants.EXTENSION_NAME;
   MESSAGE_ROUTE = constants.MESSAGE_ROUTE;
 
-  ({chainCallback, fetchSend} =
+  ({chainCallback, fetchSend, fetchSendBatched} =
    await import(`/extensions/${EXTENSION_NAME}/common/js/utils.js`));
 })().catch(error => console.error("Failed to load utilities:", error));
 
@@ -67,7 +67,7 @@ class DN_ChutesImageGenNodeHandler {
     }
     
     async initialize() {
-        const response = await fetchSend(MESSAGE_ROUTE, this.node.id, "get_models");
+        const response = await fetchSendBatched(MESSAGE_ROUTE, this.node.id, "get_models");
         const modelOptions = response.models;
         const defaultModel = response.default;
         this.modelMapping = response.model_mapping;
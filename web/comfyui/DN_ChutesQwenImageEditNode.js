@@ -1,12 +1,12 @@
 import { app } from "../../scripts/app.js"
 
-let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend;
+let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend, fetchSendBatched;
 (async () => {
    const constants = await fetch('/dadosConstants').then(response => response.json());
    EXTENSION_NAME = constants.EXTENSION_NAME;
    MESSAGE_ROUTE = constants.MESSAGE_ROUTE;
 
-   ({chainCallback, fetchSend} =
+   ({chainCallback, fetchSend, fetchSendBatched} =
     await import(`/extensions/${EXTENSION_NAME}/common/js/utils.js`));
 })();
 
@@ -20,7 +20,7 @@ class DN_ChutesQwenImageEditNode {
     }
 
     loadPrompts() {
-        return fetchSend(MESSAGE_ROUTE, this.node.id, "get_all_qwen_edit_prompts").then(response => {
+        return fetchSendBatched(MESSAGE_ROUTE, this.node.id, "get_all_qwen_edit_prompts").then(response => {
             this.updateDropdown(response.prompts);
         });
     }
@@ -14,6 +14,10 @@ let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend;
    await import(`/extensions/${EXTENSION_NAME}/common/js/utils.js`));
 })().catch(error => console.error("Failed to load utilities:", error));
 
+const MEMORY_STORAGE_NODE_TYPES = ["DN_MemoryStorage", "DN_TypedMemoryStorage"];
+// Shared by both node types, so the graph's onNodeRemoved is wrapped only once
+let extensionContext;
+
 class DN_MemoryStorage {
     constructor(node) {
         this.node = node;
@@ -40,7 +44,7 @@ class DN_MemoryStorage {
         
         function countMemoryStorageNodes(graph, count = 0) {
             for (const node of graph.nodes) {
-                if (node.type === "DN_MemoryStorage") {
+                if (MEMORY_STORAGE_NODE_TYPES.includes(node.type)) {
                     count++;
                 }
             }
@@ -62,27 +66,27 @@ class DN_MemoryStorage {
 app.registerExtension({
     name: "DN_MemoryStorage",
     async beforeRegisterNodeDef(nodeType, nodeData, app) {
-        if (nodeData.name === "DN_MemoryStorage") {
-            let extensionContext;
-            
+        if (MEMORY_STORAGE_NODE_TYPES.includes(nodeData.name)) {
             chainCallback(nodeType.prototype, 'onNodeCreated', async function () {
                 const memoryStorage = new DN_MemoryStorage(this);
                 extensionContext = memoryStorage;
             });
-            const originalOnNodeRemoved = app.graph.onNodeRemoved;
-            app.graph.onNodeRemoved = function(node) {
-                if (node.type === "DN_MemoryStorage") {
-                    const isPresent = extensionContext.checkRemainingNodes();
-                    if (!isPresent) {
-                        const rootGraphId = app.graph.rootGraph.id;
-                        console.log(rootGraphId)
-                        console.log("LAST NODE REMOVED")
-                        const payload = {rootGraphId: rootGraphId, }
-                        fetchSend(MESSAGE_ROUTE, node.id, "delete_memory_storage", payload);
+            if (nodeData.name === MEMORY_STORAGE_NODE_TYPES[0]) {
+                const originalOnNodeRemoved = app.graph.onNodeRemoved;
+                app.graph.onNodeRemoved = function(node) {
+                    if (MEMORY_STORAGE_NODE_TYPES.includes(node.type)) {
+                        const isPresent = extensionContext.checkRemainingNodes();
+                        if (!isPresent) {
+                            const rootGraphId = app.graph.rootGraph.id;
+                            console.log(rootGraphId)
+                            console.log("LAST NODE REMOVED")
+                            const payload = {rootGraphId: rootGraphId, }
+                            fetchSend(MESSAGE_ROUTE, node.id, "delete_memory_storage", payload);
+                        }
                     }
-                }
-                originalOnNodeRemoved?.apply(this, arguments);
-            };
+                    originalOnNodeRemoved?.apply(this, arguments);
+                };
+            }
             const onConnectionsChange = nodeType.prototype.onConnectionsChange;
             nodeType.prototype.onConnectionsChange = function(slotType, slot_idx, event, link_info, node_slot) {
                 if (slotType === 1 && event === true && node_slot.name === "root_graph_id") {
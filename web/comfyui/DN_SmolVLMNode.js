@@ -0,0 +1,69 @@
+import { app } from "../../scripts/app.js";
+import { api } from "../../scripts/api.js";
+import { ComfyWidgets } from "../../scripts/widgets.js";
+
+let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend;
+(async () => {
+  const constants = await fetch('/dadosConstants').then(response => response.json());
+  EXTENSION_NAME = constants.EXTENSION_NAME;
+  MESSAGE_ROUTE = constants.MESSAGE_ROUTE;
+
+  ({chainCallback, fetchSend} =
+   await import(`/extensions/${EXTENSION_NAME}/common/js/utils.js`));
+})().catch(error => console.error("Failed to load utilities:", error));
+
+class DN_SmolVLMNode {
+    constructor(node) {
+        this.node = node;
+        this.initializeWidgets();
+        this.initializeListener();
+    }
+
+    initializeWidgets() {
+        this.previewWidget = ComfyWidgets["STRING"](this.node, "stream_preview", ["STRING", { multiline: true }], app).widget;
+        this.previewWidget.inputEl.readOnly = true;
+        this.previewWidget.inputEl.placeholder = "Streamed description (enable stream_output)";
+        this.previewWidget.serialize = false;
+
+        this.node.addWidget("button", "Stop generation", null, () => {
+            fetchSend(MESSAGE_ROUTE, this.node.id, 'smolvlm_stop');
+        });
+    }
+
+    initializeListener() {
+        this.eventHandler = ({ detail }) => {
+            if (detail.id != this.node.id || detail.operation !== 'smolvlm_stream') {
+                return;
+            }
+            const { image_index, text } = detail.payload;
+            if (detail.status === 'started') {
+                const header = image_index > 0 ? `\n\n[image ${image_index + 1}]\n` : "";
+                this.previewWidget.value = image_index > 0 ? this.previewWidget.value + header : "";
+            } else {
+                this.previewWidget.value += text;
+            }
+            this.previewWidget.inputEl.scrollTop = this.previewWidget.inputEl.scrollHeight;
+        };
+
+        api.addEventListener(MESSAGE_ROUTE, this.eventHandler);
+    }
+
+    removeListener() {
+        api.removeEventListener(MESSAGE_ROUTE, this.eventHandler);
+    }
+}
+
+app.registerExtension({
+    name: "DN_SmolVLMNode",
+    async beforeRegisterNodeDef(nodeType, nodeData, app) {
+        if (nodeData.name === "DN_SmolVLMNode") {
+            chainCallback(nodeType.prototype, 'onNodeCreated', function () {
+                this.smolVLM = new DN_SmolVLMNode(this);
+            });
+
+            chainCallback(nodeType.prototype, 'onRemoved', function () {
+                this.smolVLM?.removeListener();
+            });
+        }
+    }
+});
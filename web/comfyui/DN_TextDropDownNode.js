@@ -1,12 +1,12 @@
 import { app } from "../../scripts/app.js"
 
-let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend;
+let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend, fetchSendBatched;
 (async () => {
   const constants = await fetch('/dadosConstants').then(response => response.json());
   EXTENSION_NAME = constants.EXTENSION_NAME;
   MESSAGE_ROUTE = constants.MESSAGE_ROUTE;
   
-  ({chainCallback, fetchSend} = 
+  ({chainCallback, fetchSend, fetchSendBatched} = 
    await import(`/extensions/${EXTENSION_NAME}/common/js/utils.js`));
 })().catch(error => console.error("Failed to load utilities:", error));
 
@@ -34,7 +34,7 @@ app.registerExtension({
                     payload.entries = this.dropDownEntries.filter(entry => entry !== "random");
                 }
                 
-                await fetchSend(MESSAGE_ROUTE, this.id, "update_selection", payload);
+                await fetchSendBatched(MESSAGE_ROUTE, this.id, "update_selection", payload);
             };
             
             setTimeout(async () => {
@@ -136,10 +136,10 @@ app.registerExtension({
         const originalOnNodeRemoved = app.graph.onNodeRemoved;
         app.graph.onNodeRemoved = function(node) {
             if (node.type === "DN_TextDropDownNode") {
-                fetchSend(
+                fetchSendBatched(
                     MESSAGE_ROUTE, 
                     node.id,
-                    "remove_selection"
+                    "remove_text_selection"
                 );
             }
             originalOnNodeRemoved?.apply(this, arguments);
@@ -44,13 +44,13 @@ function createSettings() {
     }));
 }
 
-let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend;
+let EXTENSION_NAME, MESSAGE_ROUTE, chainCallback, fetchSend, fetchSendBatched;
 (async () => {
   const constants = await fetch('/dadosConstants').then(response => response.json());
   EXTENSION_NAME = constants.EXTENSION_NAME;
   MESSAGE_ROUTE = constants.MESSAGE_ROUTE;
   
-  ({chainCallback, fetchSend} = 
+  ({chainCallback, fetchSend, fetchSendBatched} = 
    await import(`/extensions/${EXTENSION_NAME}/common/js/utils.js`));
 })().catch(error => console.error("Failed to load utilities:", error));
 
@@ -91,7 +91,7 @@ class DN_WildcardSelectorComposerV2 {
     }
 
     updateProcessedPromptState(isConnected) {
-        fetchSend(
+        fetchSendBatched(
             MESSAGE_ROUTE,
             this.node.id,
             "process_wildcards",
@@ -69,10 +69,84 @@ class WidgetManager {
     }
 }
 
+// Inverse of WildcardStructureCreation.compact_nodes (structure_utils.py): rebuilds the node map
+// from records that reference the prompt text by span and their parent by id
+function expandCompactNodes(records, text) {
+    // Spans count code points, as Python strings do, not UTF-16 units
+    const chars = Array.from(text);
+    const slice = (start, end) => chars.slice(start, end).join("");
+    const byId = new Map(records.map(record => [record[1], record]));
+    const children = {};
+    records.forEach(record => {
+        if (record[0] === "w") {
+            (children[record[2]] ??= {})[record[1]] = true;
+        }
+    });
+
+    const paths = new Map();
+    const pathOf = (nodeId) => {
+        if (!paths.has(nodeId)) {
+            const record = byId.get(nodeId);
+            let path = null;
+            if (record?.[0] === "s") {
+                path = nodeId;
+            } else if (record?.[0] === "x") {
+                path = record[2].path ?? null;
+            } else if (record) {
+                const parentPath = pathOf(record[2]);
+                path = parentPath !== null ? `${parentPath}/${nodeId}` : null;
+            }
+            paths.set(nodeId, path);
+        }
+        return paths.get(nodeId);
+    };
+
+    const nodes = {};
+    records.forEach(record => {
+        const [kind, nodeId] = record;
+        if (kind === "s") {
+            const [, , start, end] = record;
+            nodes[nodeId] = {
+                type: "section",
+                content: slice(start, end),
+                path: pathOf(nodeId),
+                position: { start, end },
+                children: children[nodeId] ?? {}
+            };
+        } else if (kind === "w") {
+            const [, , , start, end, options, selection] = record;
+            nodes[nodeId] = {
+                type: "wildcard",
+                content: slice(start, end),
+                path: pathOf(nodeId),
+                position: { start, end },
+                options: options.map(option => Array.isArray(option)
+                    ? slice(option[0], option[1])
+                    : { id: option, path: pathOf(option) }),
+                selection
+            };
+        } else if (kind === "c") {
+            const [, , parentWildcard, start, end] = record;
+            nodes[nodeId] = {
+                type: "choice",
+                content: slice(start, end),
+                path: pathOf(nodeId),
+                parent_wildcard: parentWildcard,
+                children: children[nodeId] ?? {}
+            };
+        } else {
+            nodes[nodeId] = record[2];
+        }
+    });
+    return nodes;
+}
+
 class StructureDataManager {
     constructor(widgetManager) {
         this.widgetManager = widgetManager;
         this.cachedStructure = null;
+        // Server revision of the structure in the widget, lets the server answer saves with a diff
+        this.revision = null;
     }
 
     getStructureData() {
@@ -103,6 +177,45 @@ class StructureDataManager {
     getStructureString() {
         return this.widgetManager.getWidgetValue("wildcards_structure_data");
     }
+
+    applyStructureDiff(diff) {
+        const structure = this.getStructureData();
+        const nodes = structure.nodes || {};
+
+        diff.removed.forEach(nodeId => delete nodes[nodeId]);
+
+        diff.shifted.forEach(([offset, nodeIds]) => {
+            nodeIds.forEach(nodeId => {
+                const position = nodes[nodeId]?.position;
+                if (position) {
+                    position.start += offset;
+                    position.end += offset;
+                }
+            });
+        });
+
+        const upserted = diff.upserted.n ? expandCompactNodes(diff.upserted.n, diff.upserted.t) : diff.upserted;
+        Object.entries(upserted).forEach(([nodeId, node]) => {
+            this.keepSelection(nodes[nodeId], node);
+            nodes[nodeId] = node;
+        });
+
+        return { ...structure, nodes, root_nodes: diff.root_nodes };
+    }
+
+    mergeSelections(newStructure) {
+        const oldNodes = this.getStructureData().nodes || {};
+        Object.entries(newStructure.nodes || {}).forEach(([nodeId, node]) => {
+            this.keepSelection(oldNodes[nodeId], node);
+        });
+        return newStructure;
+    }
+
+    keepSelection(oldNode, newNode) {
+        if (oldNode && 'selection' in oldNode && 'selection' in newNode) {
+            newNode.selection = oldNode.selection;
+        }
+    }
 }
 
 class TextMarkingService {
@@ -395,15 +508,30 @@ export class WildcardsMediator extends EventTarget {
     async performSave(content, structureString) {
         this.updateNodeData({ wildcards_prompt: content });
         
+        const revision = this.structureDataManager.revision;
+        const options = { accept_diff: true, compact: true, compress: true };
+        const payload = revision
+            ? { content, revision, ...options }
+            : { content, wildcards_structure_data: structureString, ...options };
+
         const response = await fetchSend(
             this.constants.MESSAGE_ROUTE,
             this.node.id,
             "update_wildcards_prompt",
-            { content, wildcards_structure_data: structureString }
+            payload
         );
         
-        if (response.status === 'success' && response.wildcard_structure_data !== undefined) {
-            this.handleSuccessfulSave(response.wildcard_structure_data);
+        if (response.status === 'success') {
+            this.structureDataManager.revision = response.revision ?? null;
+            if (response.wildcard_structure_diff !== undefined) {
+                this.applyStructure(this.structureDataManager.applyStructureDiff(response.wildcard_structure_diff));
+            } else if (response.wildcard_structure_compact !== undefined) {
+                const { t: text, r: rootNodes, n: records } = response.wildcard_structure_compact;
+                const structure = { nodes: expandCompactNodes(records, text), root_nodes: rootNodes };
+                this.applyStructure(this.structureDataManager.mergeSelections(structure));
+            } else if (response.wildcard_structure_data !== undefined) {
+                this.handleSuccessfulSave(response.wildcard_structure_data);
+            }
         }
         
         this.node.setDirtyCanvas(true, true);
@@ -411,15 +539,15 @@ export class WildcardsMediator extends EventTarget {
     }
 
     handleSuccessfulSave(newStructureData) {
-        this.updateNodeData({
-            wildcards_structure_data: newStructureData
-        });
-        
         const parsedStructure = JSON.parse(newStructureData);
-        this.structureDataManager.updateStructureData(parsedStructure);
+        this.applyStructure(this.structureDataManager.mergeSelections(parsedStructure));
+    }
+
+    applyStructure(structure) {
+        this.structureDataManager.updateStructureData(structure);
         
         this.textMarkingService.clearAllMarks();
-        this.queueEvent('structure-update', parsedStructure);
+        this.queueEvent('structure-update', structure);
     }
 
     processMarkRequest(requestData) {
@@ -48,6 +48,53 @@ export async function fetchSend(route, id, operation, payload=null) {
   }
 }
 
+// Operations queued by fetchSendBatched, per route, until the end of the current task
+const pendingBatches = new Map();
+
+// Like fetchSend, but calls made in the same task share one POST to the route as a batch
+// ({operation: "batch", payload: {operations: [...]}}); each call still gets its own result.
+export function fetchSendBatched(route, id, operation, payload=null) {
+  return new Promise((resolve, reject) => {
+    const message = { id: id, operation: operation };
+    if (payload !== null) {
+      message.payload = payload;
+    }
+
+    let batch = pendingBatches.get(route);
+    if (!batch) {
+      batch = [];
+      pendingBatches.set(route, batch);
+      setTimeout(() => flushBatch(route), 0);
+    }
+    batch.push({ message, resolve, reject });
+  });
+}
+
+async function flushBatch(route) {
+  const batch = pendingBatches.get(route);
+  pendingBatches.delete(route);
+
+  if (batch.length === 1) {
+    const { message, resolve, reject } = batch[0];
+    fetchSend(route, message.id, message.operation, message.payload ?? null).then(resolve, reject);
+    return;
+  }
+
+  try {
+    const response = await fetchSend(route, null, "batch", { operations: batch.map(entry => entry.message) });
+    response.results.forEach((result, index) => {
+      if (result.status >= 400) {
+        const error = new Error(`Error: ${result.status} - ${JSON.stringify(result.body)}`);
+        console.error(`Batched call ${batch[index].message.operation} to ${route} failed:`, error);
+        batch[index].reject(error);
+      } else {
+        batch[index].resolve(result.body);
+      }
+    });
+  } catch (error) {
+    batch.forEach(entry => entry.reject(error));
+  }
+}
 
 export async function getWidget(node, name, maxRetries = 3) {
   const checkWidget = (retries = 0) => {